@@ -0,0 +1,831 @@
+"""
+Throughput benchmarks for the NER engine.
+
+Usage:
+    python src/benchmark_ner.py --suite pass1 --limit 200
+    python src/benchmark_ner.py --suite gating --limit 0
+
+Each suite loads posts from the Dreaddit CSV, times the relevant code paths
+and checks that the optimized path returns exactly the same results as the
+reference path before reporting numbers.
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+try:
+    from src.ner_engine import OntologyNER, POST_SEPARATOR
+    from src.matchers import ContextPatternScanner, RegexTermMatcher, TokenStream, TokenTermMatcher, build_pass1_matcher
+    from src.lexicon_data import MANUAL_LEXICON_FILE, save_lexicon_file
+except ImportError:
+    from ner_engine import OntologyNER, POST_SEPARATOR
+    from matchers import ContextPatternScanner, RegexTermMatcher, TokenStream, TokenTermMatcher, build_pass1_matcher
+    from lexicon_data import MANUAL_LEXICON_FILE, save_lexicon_file
+
+
+def load_posts(path, limit=0):
+    """Load post texts from a CSV with a 'text' column."""
+    import pandas as pd
+    df = pd.read_csv(path)
+    if limit > 0:
+        df = df.head(limit)
+    return [str(t) for t in df['text'].fillna('')]
+
+
+def time_call(fn, *args, repeat=1):
+    """Return (best wall time in seconds, last result) over `repeat` runs."""
+    best, result = None, None
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        result = fn(*args)
+        elapsed = time.perf_counter() - t0
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def report(label, seconds, n_posts, n_chars):
+    rate = n_posts / seconds if seconds > 0 else float('inf')
+    mb_s = n_chars / seconds / 1e6 if seconds > 0 else float('inf')
+    print(f"  {label:<28} {seconds * 1000:10.1f} ms  {rate:12.1f} posts/s  {mb_s:8.2f} MB/s")
+
+
+def bench_pass1(posts, args):
+    """Pass 1 dictionary matching: regex alternation vs token lookup."""
+    ner = OntologyNER(improved=args.improved)
+    terms = ner.sorted_terms
+    n_chars = sum(len(p) for p in posts)
+
+    print(f"\n=== Pass 1 matcher throughput ({len(posts)} posts, {len(terms)} terms) ===")
+    results = {}
+    for name in ("regex", "token"):
+        t0 = time.perf_counter()
+        matcher = build_pass1_matcher(name, terms)
+        build_time = time.perf_counter() - t0
+        seconds, spans = time_call(lambda: [list(matcher.finditer(p)) for p in posts], repeat=args.repeat)
+        results[name] = (seconds, spans)
+        print(f"  [{name}] build: {build_time * 1000:.1f} ms")
+        report(f"{name} scan", seconds, len(posts), n_chars)
+
+    if results["regex"][1] != results["token"][1]:
+        print("  [!] Span mismatch between regex and token matchers.")
+    else:
+        print("  Outputs identical.")
+    print(f"  Speedup: {results['regex'][0] / max(results['token'][0], 1e-9):.1f}x")
+
+
+def bench_pass2(posts, args):
+    """Pass 2 contextual patterns: per-pattern finditer loop vs fused scanner."""
+    import re
+    ner = OntologyNER(improved=True)
+    patterns = ner.pass2_patterns
+    scanner = ner.pass2_scanner
+    n_chars = sum(len(p) for p in posts)
+
+    def per_pattern(text):
+        return [(i, m.start(), m.end())
+                for i, (pattern, _) in enumerate(patterns)
+                for m in re.finditer(pattern, text, re.IGNORECASE)]
+
+    print(f"\n=== Pass 2 contextual scan ({len(posts)} posts, {len(patterns)} patterns) ===")
+    loop_time, loop_out = time_call(lambda: [per_pattern(p) for p in posts], repeat=args.repeat)
+    fused_time, fused_out = time_call(lambda: [scanner.scan(p, prefilter=False) for p in posts], repeat=args.repeat)
+    anchor_time, anchor_out = time_call(lambda: [scanner.scan(p) for p in posts], repeat=args.repeat)
+    report("per-pattern loop", loop_time, len(posts), n_chars)
+    report("fused scanner", fused_time, len(posts), n_chars)
+    report("fused + anchor prefilter", anchor_time, len(posts), n_chars)
+    print(f"  Per post: {loop_time / len(posts) * 1e6:.1f} us -> {fused_time / len(posts) * 1e6:.1f} us"
+          f" -> {anchor_time / len(posts) * 1e6:.1f} us")
+
+    from src.matchers import WORD_RE, fold_case
+    active = [len(scanner.active_patterns(set(WORD_RE.findall(fold_case(p))))) for p in posts]
+    skipped = sum(1 for a in active if a == 0)
+    print(f"  Active patterns per post: {sum(active) / max(len(active), 1):.2f} of {len(patterns)}"
+          f" ({skipped} posts skip Pass 2 entirely)")
+    identical = loop_out == fused_out == anchor_out
+    print("  Outputs identical." if identical else "  [!] Output mismatch between loop and fused scanner.")
+
+
+def bench_tokens(posts, args):
+    """Each pass tokenizing the post itself vs one TokenStream shared by all passes."""
+    import re
+    import tracemalloc
+    ner = OntologyNER(improved=True)
+    matcher, scanner, annotator = ner.pass1_matcher, ner.pass2_scanner, ner.context_annotator
+    n_chars = sum(len(p) for p in posts)
+
+    def separate(text):
+        spans = list(matcher.finditer(text))
+        patterns = scanner.scan(text)
+        words = [m.group().lower() for m in re.finditer(r'\b\w{4,}\b', text)]
+        cues = annotator.annotate(text, spans)
+        return spans, patterns, words, cues.occurrences
+
+    def shared(text):
+        tokens = TokenStream(text)
+        spans = list(matcher.finditer(text, tokens))
+        patterns = scanner.scan(text, tokens=tokens)
+        if tokens.plain:
+            words = [w for w in tokens.words if len(w) >= 4]
+        else:
+            # Folded tokens can differ from str.lower() (e.g. 'ſ', 'İ'); the fuzzy pass lowercases the post's slice
+            words = [text[s:e].lower() for s, e in zip(tokens.starts, tokens.ends) if e - s >= 4]
+        cues = annotator.annotate(text, spans, tokens)
+        return spans, patterns, words, cues.occurrences
+
+    def peak_kb(fn):
+        """Mean peak of memory allocated while processing one post."""
+        total = 0
+        tracemalloc.start()
+        for p in posts:
+            tracemalloc.reset_peak()
+            base = tracemalloc.get_traced_memory()[0]
+            fn(p)
+            total += tracemalloc.get_traced_memory()[1] - base
+        tracemalloc.stop()
+        return total / max(len(posts), 1) / 1024
+
+    print(f"\n=== Shared token stream ({len(posts)} posts: Pass 1, Pass 2, fuzzy words, context cues) ===")
+    sep_time, sep_out = time_call(lambda: [separate(p) for p in posts], repeat=args.repeat)
+    shared_time, shared_out = time_call(lambda: [shared(p) for p in posts], repeat=args.repeat)
+    report("tokenized per pass", sep_time, len(posts), n_chars)
+    report("shared TokenStream", shared_time, len(posts), n_chars)
+    print(f"  Peak allocation per post: {peak_kb(separate):.1f} KB -> {peak_kb(shared):.1f} KB")
+    print("  Outputs identical." if sep_out == shared_out else "  [!] Shared token stream output differs.")
+
+
+def bench_casefold(posts, args):
+    """re.IGNORECASE on the original post vs case-sensitive matching on the folded post."""
+    import copy
+    import re
+    ner = OntologyNER(improved=args.improved)
+    n_chars = sum(len(p) for p in posts)
+    streams = [TokenStream(p) for p in posts]
+
+    print(f"\n=== Case folding ({len(posts)} posts) ===")
+    same = True
+
+    def compare(label, build, run):
+        nonlocal same
+        outputs = []
+        for mode, case_fold in (("IGNORECASE", False), ("folded", True)):
+            component = build(case_fold)
+            elapsed, out = time_call(lambda: [run(component, p, t) for p, t in zip(posts, streams)], repeat=args.repeat)
+            report(f"{label}, {mode}", elapsed, len(posts), n_chars)
+            outputs.append(out)
+        same = same and outputs[0] == outputs[1]
+
+    compare("Pass 1 regex", lambda case_fold: RegexTermMatcher(ner.sorted_terms, case_fold),
+            lambda matcher, p, t: list(matcher.finditer(p, t)))
+    compare("Pass 1 token", lambda case_fold: TokenTermMatcher(ner.sorted_terms, case_fold),
+            lambda matcher, p, t: list(matcher.finditer(p, t)))
+    patterns = ner.pass2_patterns
+    compare("Pass 2", lambda case_fold: ContextPatternScanner(patterns, case_fold),
+            lambda scanner, p, t: scanner.scan(p, False, t))
+    compare("Pass 2 + anchors", lambda case_fold: ContextPatternScanner(patterns, case_fold),
+            lambda scanner, p, t: scanner.scan(p, True, t))
+
+    # Whole extract() with the IGNORECASE matchers swapped back in
+    ignorecase = copy.copy(ner)
+    ignorecase.lexicon = ner._derive_lexicon(ner.lexicon,
+                                             pass1_matcher=TokenTermMatcher(ner.sorted_terms, case_fold=False),
+                                             pass2_scanner=ContextPatternScanner(patterns, case_fold=False))
+    base_time, expected = time_call(lambda: [ignorecase.extract(p) for p in posts], repeat=args.repeat)
+    folded_time, result = time_call(lambda: [ner.extract(p) for p in posts], repeat=args.repeat)
+    report("extract(), IGNORECASE", base_time, len(posts), n_chars)
+    report("extract(), folded", folded_time, len(posts), n_chars)
+    same = same and result == expected
+    print("  Outputs identical." if same else "  [!] Folded matching differs from IGNORECASE matching.")
+
+    # Without CPython's private regex internals every pattern must fall back to re.IGNORECASE
+    fallback = _matchers_without_regex_internals()
+    components = [fallback.RegexTermMatcher(ner.sorted_terms), fallback.TokenTermMatcher(ner.sorted_terms),
+                  fallback.ContextPatternScanner(patterns)]
+    regexes = [components[0].regex, components[1].irregular_regex, components[1].irregular_lead_regex]
+    regexes += components[2].compiled
+    ignorecase_only = all(r.flags & re.IGNORECASE for r in regexes if r is not None)
+    reference = [RegexTermMatcher(ner.sorted_terms), ner.pass1_matcher, ner.pass2_scanner]
+
+    def run_all(regex, token, scanner):
+        return [(list(regex.finditer(p)), list(token.finditer(p)), scanner.scan(p)) for p in posts]
+
+    same = ignorecase_only and run_all(*components) == run_all(*reference)
+    print("  Fallback without regex internals: " + ("IGNORECASE only, outputs identical." if same
+                                                     else "[!] differs from the folded matchers."))
+
+
+def _matchers_without_regex_internals():
+    """A separate import of matchers.py that finds none of CPython's private regex modules."""
+    import importlib.util
+    blocked = ("re._casefix", "sre_parse", "sre_constants", "sre_compile")
+    saved = {name: sys.modules[name] for name in blocked if name in sys.modules}
+    sys.modules.update(dict.fromkeys(blocked))  # a None entry makes the import fail
+    try:
+        spec = importlib.util.spec_from_file_location("matchers_fallback", sys.modules[TokenStream.__module__].__file__)
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+    finally:
+        for name in blocked:
+            del sys.modules[name]
+        sys.modules.update(saved)
+    return module
+
+
+def bench_gating(posts, args):
+    """Fuzzy calls avoided by the common-word gate; gated output must equal ungated output."""
+    try:
+        from src.run_eval import run_evaluation_suite
+    except ImportError:
+        from run_eval import run_evaluation_suite
+    import pandas as pd
+
+    engines = {
+        "ungated": OntologyNER(improved=True, common_words_path=None),
+        "gated": OntologyNER(improved=True),
+    }
+    n_chars = sum(len(p) for p in posts)
+
+    print(f"\n=== Fuzzy gating ({len(posts)} posts, {len(engines['gated'].common_words)} gate words) ===")
+    outputs = {}
+    for name, ner in engines.items():
+        seconds, outputs[name] = time_call(lambda: [ner.extract(p) for p in posts])
+        stats = ner.fuzzy_cache_stats()
+        report(f"{name} extract", seconds, len(posts), n_chars)
+        print(f"    fuzzy calls: {stats['hits'] + stats['misses']} (index lookups: {stats['misses']}), gated: {stats['gated']}")
+    changed = sum(a != b for a, b in zip(outputs["ungated"], outputs["gated"]))
+    print("  Outputs identical." if not changed else
+          f"  [!] Gated output differs from ungated output on {changed}/{len(posts)} posts.")
+
+    if os.path.exists(args.annotations):
+        df = pd.read_csv(args.annotations)
+        gold_col = 'gold_symptoms' if 'gold_symptoms' in df.columns else 'gold'
+        df['gold_symptoms'] = df[gold_col].fillna("").astype(str)
+        df = df[df['gold_symptoms'].str.strip() != ""]
+        print(f"  Recall impact on {args.annotations} ({len(df)} posts):")
+        for name, ner in engines.items():
+            stats, _ = run_evaluation_suite(df, ner, name, mode="strict-concept", lookup={})
+            print(f"    {name:<10} Recall {stats['Recall']:.4f}  Precision {stats['Precision']:.4f}  F1 {stats['F1']:.4f}")
+    else:
+        print(f"  {args.annotations} not found; skipping recall comparison.")
+
+
+def bench_eval(posts, args):
+    """Evaluator time per mode, with strict-concept scores re-derived from concept codes."""
+    try:
+        from src.run_eval import HARDCODED_EXAMPLES, parse_gold_entry, run_evaluation_suite
+        from src.concepts import CONCEPTS
+    except ImportError:
+        from run_eval import HARDCODED_EXAMPLES, parse_gold_entry, run_evaluation_suite
+        from concepts import CONCEPTS
+    import pandas as pd
+
+    if os.path.exists(args.annotations):
+        df = pd.read_csv(args.annotations)
+        gold_col = 'gold_symptoms' if 'gold_symptoms' in df.columns else 'gold'
+        df['gold_symptoms'] = df[gold_col].fillna("").astype(str)
+        df = df[df['gold_symptoms'].str.strip() != ""]
+        source = args.annotations
+    else:
+        df = pd.DataFrame(HARDCODED_EXAMPLES)
+        source = "internal validation set"
+    ner = OntologyNER(improved=args.improved)
+
+    print(f"\n=== Evaluator ({len(df)} posts, {source}) ===")
+    scores = {}
+    for mode, param in (("strict", None), ("concept", None), ("strict-concept", None), ("relaxed", 0.5)):
+        t0 = time.perf_counter()
+        scores[mode], _ = run_evaluation_suite(df, ner, mode, mode=mode, param=param, lookup={})
+        elapsed = time.perf_counter() - t0
+        s = scores[mode]
+        print(f"  {mode:<16} {elapsed * 1000:10.1f} ms  Recall {s['Recall']:.4f}  Precision {s['Precision']:.4f}  F1 {s['F1']:.4f}")
+
+    # Reference: the same strict-concept counts, with gold and predictions compared as codes
+    tp = fp = fn = 0
+    for _, row in df.iterrows():
+        gold = {CONCEPTS.lookup(c) for c in parse_gold_entry(row['gold_symptoms'], ner)}
+        if not gold:
+            continue
+        pred = {m.code for m in ner.extract(str(row.get('text', '')))}
+        tp, fp, fn = tp + len(gold & pred), fp + len(pred - gold), fn + len(gold - pred)
+    s = scores["strict-concept"]
+    same = (s['TP'], s['FP'], s['FN']) == (tp, fp, fn)
+    print("  Strict concept scores identical." if same else
+          f"  [!] Strict concept scores differ: TP/FP/FN {s['TP']}/{s['FP']}/{s['FN']} vs codes {tp}/{fp}/{fn}.")
+
+
+def bench_context(posts, args):
+    """Negation/temporal/intensity cues: regex search per match window vs one-pass annotator."""
+    import re
+    try:
+        from src import context_cues as cc
+    except ImportError:
+        import context_cues as cc
+
+    # The original per-window searches: uncompiled patterns, IGNORECASE, on the raw text
+    def cue_regex(phrases, tail):
+        alternation = "|".join(re.escape(p).replace(r"\ ", r"\s+") for p in phrases)
+        return rf"\b(?:{alternation}){tail}"
+
+    tails = {"ws": r"\s+", "ws_word_ws": r"\s+\w+\s+"}
+    negation = [cue_regex(phrases, tails[trailing]) for phrases, trailing in cc.NEGATION_CUES]
+    temporal = [(label, cue_regex(phrases, r"\b")) for label, phrases in cc.TEMPORAL_MARKERS]
+    intensity = [(label, cue_regex(phrases, r"\b")) for label, phrases in cc.INTENSITY_MARKERS]
+
+    def windowed(text, spans):
+        out = []
+        for start, end in spans:
+            before = text[max(0, start - cc.NEGATION_WINDOW):start]
+            temporal_ctx = text[max(0, start - cc.TEMPORAL_WINDOW):end]
+            intensity_ctx = text[max(0, start - cc.INTENSITY_WINDOW):start]
+            out.append((
+                any(re.search(p, before, re.IGNORECASE) for p in negation),
+                next((label for label, p in temporal if re.search(p, temporal_ctx, re.IGNORECASE)), "present"),
+                next((label for label, p in intensity if re.search(p, intensity_ctx, re.IGNORECASE)), "medium"),
+            ))
+        return out
+
+    annotator = cc.ContextAnnotator()
+
+    def one_pass(text, spans):
+        cues = annotator.annotate(text, spans)
+        return [(cues.negated(s), cues.temporal(s, e), cues.intensity(s)) for s, e in spans]
+
+    ner = OntologyNER(improved=True)
+    spans = [[(m['start'], m['end']) for m in ner.extract(p)] for p in posts]
+    n_chars = sum(len(p) for p in posts)
+    n_matches = sum(len(s) for s in spans)
+
+    print(f"\n=== Context cues ({len(posts)} posts, {n_matches} matches) ===")
+    window_time, window_out = time_call(lambda: [windowed(p, s) for p, s in zip(posts, spans)], repeat=args.repeat)
+    pass_time, pass_out = time_call(lambda: [one_pass(p, s) for p, s in zip(posts, spans)], repeat=args.repeat)
+    report("regex per window", window_time, len(posts), n_chars)
+    report("one-pass annotator", pass_time, len(posts), n_chars)
+    print(f"  Speedup: {window_time / max(pass_time, 1e-9):.1f}x")
+    print("  Outputs identical." if window_out == pass_out else "  [!] Cue mismatch between window regex and annotator.")
+
+
+def bench_spans(posts, args):
+    """Greedy span selection on long pastes: per-character coverage array vs interval set."""
+    def coverage_array(text_len, matches):
+        matches = sorted(matches, key=lambda x: (x['end'] - x['start'], x['confidence']), reverse=True)
+        final_results = []
+        covered_indices = [False] * text_len
+        for match in matches:
+            start, end = match['start'], match['end']
+            if sum(covered_indices[start:end]) < (end - start) * 0.5:
+                final_results.append(match)
+                for i in range(start, end):
+                    covered_indices[i] = True
+        return sorted(final_results, key=lambda x: x['start'])
+
+    # Concatenate posts into pastes of at least --paste-kb kilobytes
+    target = args.paste_kb * 1000
+    pastes, chunk, size = [], [], 0
+    for post in posts:
+        chunk.append(post)
+        size += len(post) + 1
+        if size >= target:
+            pastes.append("\n".join(chunk))
+            chunk, size = [], 0
+    if not pastes:
+        pastes.append("\n".join(chunk))
+
+    ner = OntologyNER(improved=args.improved)
+    n_chars = sum(len(p) for p in pastes)
+    print(f"\n=== Span selection on long pastes ({len(pastes)} pastes, {n_chars / len(pastes) / 1000:.0f} KB avg) ===")
+    collect_time, candidates = time_call(lambda: [ner._collect_candidates(ner.lexicon, p) for p in pastes])
+    n_candidates = sum(len(c) for c in candidates)
+    array_time, array_out = time_call(
+        lambda: [coverage_array(len(p), c) for p, c in zip(pastes, candidates)], repeat=args.repeat)
+    interval_time, interval_out = time_call(
+        lambda: [ner._select_spans(list(c)) for c in candidates], repeat=args.repeat)
+    report("candidate passes", collect_time, len(pastes), n_chars)
+    report("coverage array select", array_time, len(pastes), n_chars)
+    report("interval set select", interval_time, len(pastes), n_chars)
+    print(f"  {n_candidates} candidates, selection speedup: {array_time / max(interval_time, 1e-9):.1f}x")
+    try:
+        from src.spans import IntervalSet
+    except ImportError:
+        from spans import IntervalSet
+    bounds = max(len(IntervalSet((m['start'], m['end']) for m in out).bounds) for out in interval_out)
+    print(f"  Coverage state per paste: {max(len(p) for p in pastes)} array slots vs {bounds} interval boundaries")
+    print("  Outputs identical." if array_out == interval_out else "  [!] Selection mismatch.")
+
+
+def bench_emoji(posts, args):
+    """Pass 0 emoji lookup: text.find per table entry vs single-scan matcher, as the table grows."""
+    try:
+        from src.matchers import EmojiMatcher
+    except ImportError:
+        from matchers import EmojiMatcher
+
+    def find_loop(table, text):
+        out = []
+        for emoji in table:
+            idx = 0
+            while idx < len(text):
+                idx = text.find(emoji, idx)
+                if idx == -1:
+                    break
+                out.append((emoji, idx, idx + len(emoji)))
+                idx += len(emoji)
+        return out
+
+    ner = OntologyNER(improved=True)
+    n_chars = sum(len(p) for p in posts)
+    # Pad the real table with other pictographs (U+1F300 onwards) to simulate a larger lexicon
+    grown = dict(ner.emoji_map)
+    for cp in range(0x1F300, 0x1F300 + 1000):
+        if len(grown) >= args.emoji_table:
+            break
+        grown.setdefault(chr(cp), "HP:0000000")
+
+    print(f"\n=== Emoji Pass 0 ({len(posts)} posts, {sum(not p.isascii() for p in posts)} with non-ASCII text) ===")
+    for table in (ner.emoji_map, grown):
+        matcher = EmojiMatcher(table)
+        loop_time, loop_out = time_call(lambda: [find_loop(table, p) for p in posts], repeat=args.repeat)
+        scan_time, scan_out = time_call(lambda: [matcher.finditer(p) for p in posts], repeat=args.repeat)
+        print(f"  Table of {len(table)} entries:")
+        report("find() per entry", loop_time, len(posts), n_chars)
+        report("single scan", scan_time, len(posts), n_chars)
+        print("  Outputs identical." if loop_out == scan_out else "  [!] Emoji mismatch.")
+
+
+def bench_matches(posts, args):
+    """Resident size of extraction results: dicts vs slotted Match objects vs columnar batch."""
+    import tracemalloc
+    try:
+        from src.matches import Match, MatchBatch
+    except ImportError:
+        from matches import Match, MatchBatch
+
+    ner = OntologyNER(improved=args.improved)
+    results = [ner.extract(p) for p in posts]
+    n_matches = sum(len(r) for r in results)
+
+    def measure(build):
+        tracemalloc.start()
+        before = tracemalloc.get_traced_memory()[0]
+        kept = build()
+        size = tracemalloc.get_traced_memory()[0] - before
+        tracemalloc.stop()
+        return size, kept
+
+    print(f"\n=== Match representation ({len(posts)} posts, {n_matches} matches) ===")
+    # Post texts are shared by all three and not counted
+    dict_size, dicts = measure(lambda: [[m.to_dict() for m in r] for r in results])
+    slot_size, slots = measure(lambda: [[Match(m.source, m.start, m.end, m.code, m.match_type, m.confidence,
+                                              m.negated, m.temporal, m.intensity) for m in r] for r in results])
+    batch_size, batch = measure(lambda: MatchBatch.from_results(posts, results))
+    for label, size in (("dicts", dict_size), ("slotted Match", slot_size), ("columnar MatchBatch", batch_size)):
+        print(f"  {label:<28} {size / 1024:10.1f} KB  {size / max(n_matches, 1):8.1f} bytes/match")
+    same = dicts == [[m.to_dict() for m in batch.matches(i)] for i in range(len(batch))] == [
+        [m.to_dict() for m in r] for r in slots]
+    print("  Views identical." if same else "  [!] Representation mismatch.")
+
+
+def bench_aggregate(posts, args):
+    """Pipeline concept dedup: per-post sets of ID strings vs of codes vs numpy over a MatchBatch."""
+    import numpy as np
+    try:
+        from src.concepts import CONCEPTS
+        from src.matches import MatchBatch
+    except ImportError:
+        from concepts import CONCEPTS
+        from matches import MatchBatch
+
+    ner = OntologyNER(improved=args.improved)
+    results = [ner.extract(p) for p in posts]
+    n_matches = sum(len(r) for r in results)
+    min_confidence = 0.6
+
+    def per_post(key):
+        unique, total = set(), 0
+        for matches in results:
+            concepts = {key(m) for m in matches if m.confidence >= min_confidence}
+            total += len(concepts)
+            unique.update(concepts)
+        return total, unique
+
+    # The batch is built outside the timing, as extract_columnar() would return it
+    batch = MatchBatch.from_results(posts, results)
+
+    def columnar():
+        codes = np.frombuffer(batch.concept_codes, dtype=np.int32)
+        post_of_match = np.repeat(np.arange(len(batch), dtype=np.int64),
+                                  np.diff(np.frombuffer(batch.post_offsets, dtype=np.int64)))
+        valid = np.frombuffer(batch.confidences, dtype=np.float64) >= min_confidence
+        codes, post_of_match = codes[valid], post_of_match[valid]
+        stride = int(codes.max()) + 1 if len(codes) else 1
+        return len(np.unique(post_of_match * stride + codes)), set(np.unique(codes).tolist())
+
+    print(f"\n=== Concept aggregation ({len(posts)} posts, {n_matches} matches) ===")
+    runs = [
+        ("ID strings, m.id", lambda: per_post(lambda m: m.id)),
+        ("codes, m.code", lambda: per_post(lambda m: m.code)),
+        ("codes, MatchBatch + numpy", columnar),
+    ]
+    outputs = []
+    for label, fn in runs:
+        seconds, (total, unique) = time_call(fn, repeat=args.repeat)
+        outputs.append((total, {CONCEPTS.concept_id(c) if isinstance(c, int) else c for c in unique}))
+        print(f"  {label:<28} {seconds * 1000:10.2f} ms  {seconds / max(n_matches, 1) * 1e6:8.3f} us/match")
+    print("  Aggregates identical." if all(o == outputs[0] for o in outputs) else "  [!] Aggregates differ.")
+
+
+def bench_triage(posts, args):
+    """Triage queries: full extract() + filter vs has_any()/first_match() early exit."""
+    ner = OntologyNER(improved=args.improved)
+    concepts = set(args.concepts.split(","))
+    n_chars = sum(len(p) for p in posts)
+    [ner.extract(p) for p in posts]  # warm the fuzzy memo so both paths do the same lookups
+
+    def full(text):
+        return any(m['id'] in concepts for m in ner.extract(text))
+
+    print(f"\n=== Triage queries ({len(posts)} posts, concepts: {', '.join(sorted(concepts))}) ===")
+    full_time, full_out = time_call(lambda: [full(p) for p in posts], repeat=args.repeat)
+    any_time, any_out = time_call(lambda: [ner.has_any(p, concepts) for p in posts], repeat=args.repeat)
+    first_time, first_out = time_call(lambda: [ner.first_match(p) for p in posts], repeat=args.repeat)
+    report("extract + filter", full_time, len(posts), n_chars)
+    report("has_any", any_time, len(posts), n_chars)
+    report("first_match (any concept)", first_time, len(posts), n_chars)
+    print(f"  Positive posts: {sum(any_out)}/{len(posts)}")
+    expected_first = [next(iter(ner.extract(p)), None) for p in posts]
+    same = full_out == any_out and [m and dict(m) for m in first_out] == [m and dict(m) for m in expected_first]
+    print("  Outputs identical." if same else "  [!] Query mismatch against extract().")
+
+
+def bench_startup(posts, args):
+    """Engine construction: full lexicon build vs loading the persisted artifact vs sharing a live engine's core."""
+    def construct(**kwargs):
+        # Engines with the same inputs share a LexiconCore while one is alive, so each run drops
+        # its engine before the next; returns (best time, what the last engine extracted)
+        best, outputs = None, None
+        for _ in range(args.repeat):
+            t0 = time.perf_counter()
+            ner = OntologyNER(improved=args.improved, **kwargs)
+            elapsed = time.perf_counter() - t0
+            best = elapsed if best is None else min(best, elapsed)
+            outputs = (ner.artifact_path, dict(ner.term_to_id), list(ner.sorted_terms), [ner.extract(p) for p in posts])
+            del ner
+        return best, outputs
+
+    build_time, built = construct(artifact_dir=None, rebuild_artifact=True)
+    OntologyNER(improved=args.improved)  # make sure a current artifact exists
+    load_time, loaded = construct()
+    live = OntologyNER(improved=args.improved)
+    share_time, shared = time_call(lambda: OntologyNER(improved=args.improved), repeat=args.repeat)
+
+    print(f"\n=== Startup ({len(built[2])} terms, artifact {loaded[0]}) ===")
+    print(f"  {'build lexicon':<28} {build_time * 1000:10.1f} ms")
+    print(f"  {'load artifact':<28} {load_time * 1000:10.1f} ms")
+    print(f"  {'share a live engine core':<28} {share_time * 1000:10.1f} ms")
+    same = (built[1:] == loaded[1:] and shared.lexicon_core is live.lexicon_core
+            and loaded[3] == [shared.extract(p) for p in posts])
+    print("  Outputs identical." if same else "  [!] Artifact or shared engine differs from a fresh build.")
+
+    # The other mode's engine shares the same core and must match one built on its own
+    other_time, other = time_call(lambda: OntologyNER(improved=not args.improved))
+    separate = OntologyNER(improved=not args.improved, artifact_dir=None)
+    print(f"  {'other mode, shared core':<28} {other_time * 1000:10.1f} ms")
+    same = (other.lexicon_core is live.lexicon_core and separate.lexicon_core is not live.lexicon_core
+            and dict(other.term_to_id) == dict(separate.term_to_id) and other.sorted_terms == separate.sorted_terms
+            and [other.extract(p) for p in posts] == [separate.extract(p) for p in posts])
+    print("  Baseline and improved engines share one core; outputs identical." if same
+          else "  [!] The other mode's engine differs from one built on its own, or does not share the core.")
+
+
+def bench_update(posts, args):
+    """update_lexicon() with a few new slang terms vs rebuilding the engine from an edited lexicon file."""
+    import shutil
+    import tempfile
+    terms = {"doomscrolling": "HP:0000716", "feel empty inside": "HP:0000716", "zoned out": "HP:0002126"}
+    readded = {"gloomy": "HP:0000739"}  # an existing lexicon term, removed and added back with a new concept
+    ner = OntologyNER(improved=args.improved)
+    update_time, _ = time_call(ner.update_lexicon, terms)
+    ner.update_lexicon(readded, remove=list(readded))
+    lexicon_dir = tempfile.mkdtemp()
+    try:
+        save_lexicon_file(lexicon_dir, MANUAL_LEXICON_FILE, ner.manual_lexicon)
+        rebuild_time, rebuilt = time_call(
+            lambda: OntologyNER(improved=args.improved, artifact_dir=None, lexicon_dir=lexicon_dir))
+    finally:
+        shutil.rmtree(lexicon_dir)
+
+    print(f"\n=== Lexicon update ({len(terms)} terms added to {len(rebuilt.sorted_terms)}) ===")
+    print(f"  {'update_lexicon()':<28} {update_time * 1000:10.1f} ms")
+    print(f"  {'rebuild engine':<28} {rebuild_time * 1000:10.1f} ms")
+    texts = posts + ["I keep doomscrolling and feel empty inside", "totally zoned out in class",
+                     "so gloomy today, feeling glomy and gloomey"]
+    same = (ner.term_to_id == rebuilt.term_to_id and ner.sorted_terms == rebuilt.sorted_terms
+            and [ner.extract(t) for t in texts] == [rebuilt.extract(t) for t in texts])
+    print("  Outputs identical." if same else "  [!] Updated engine differs from a rebuilt one.")
+
+
+def bench_concat(posts, args):
+    """extract_many() over concatenated chunks vs per-post extract(), on posts and on single sentences."""
+    import re
+    ner = OntologyNER(improved=args.improved)
+    sentences = [s for p in posts for s in re.split(r'(?<=[.!?])\s+', p) if s]
+    for label, texts in (("posts", posts), ("sentences", sentences)):
+        n_chars = sum(len(t) for t in texts)
+        # extract_many() only concatenates ASCII posts; the others take the per-post path
+        per_post = [t for t in texts if not t.isascii() or POST_SEPARATOR in t]
+        print(f"\n=== Concatenated scanning, {label} ({len(texts)} texts) ===")
+        print(f"  per-post path: {len(per_post)} texts ({len(per_post) / max(len(texts), 1):.1%}), "
+              f"{sum(len(t) for t in per_post) / max(n_chars, 1):.1%} of characters")
+        base_time, expected = time_call(lambda: [ner.extract(t) for t in texts], repeat=args.repeat)
+        report("per-post extract()", base_time, len(texts), n_chars)
+        same = True
+        for chunk_chars in (2048, 8192, 32768):
+            elapsed, result = time_call(ner.extract_many, texts, chunk_chars, repeat=args.repeat)
+            report(f"extract_many {chunk_chars // 1024}k chunks", elapsed, len(texts), n_chars)
+            same = same and result == expected
+        print("  Outputs identical." if same else "  [!] Concatenated output differs from per-post extraction.")
+
+
+def _batch_scaling(ner, posts, args, executor):
+    """Time extract_batch() with 1..N workers of `executor` and check it matches serial extraction."""
+    n_chars = sum(len(p) for p in posts)
+    max_workers = args.workers or os.cpu_count() or 1
+
+    def run(workers):
+        ner.fuzzy_memo.clear()  # every run starts cold, as a fresh ingest would
+        return ner.extract_batch(posts, workers=workers, chunksize=args.chunksize, executor=executor)
+
+    serial_time, expected = time_call(run, 1, repeat=args.repeat)
+    report("1 worker", serial_time, len(posts), n_chars)
+    same = True
+    for workers in range(2, max_workers + 1):
+        elapsed, result = time_call(run, workers, repeat=args.repeat)
+        report(f"{workers} workers ({serial_time / elapsed:.2f}x)", elapsed, len(posts), n_chars)
+        same = same and result == expected
+    print("  Outputs identical." if same else "  [!] Batch output differs from serial extraction.")
+
+
+def bench_scaling(posts, args):
+    """extract_batch() throughput with 1..N forked worker processes."""
+    ner = OntologyNER(improved=args.improved)
+    print(f"\n=== Batch scaling, processes ({len(posts)} posts, {os.cpu_count()} CPUs) ===")
+    _batch_scaling(ner, posts, args, "process")
+
+
+def bench_threads(posts, args):
+    """extract_batch() throughput with 1..N threads sharing one engine, with the GIL on and off."""
+    import subprocess
+    import sysconfig
+    ner = OntologyNER(improved=args.improved)
+    free_threaded = bool(sysconfig.get_config_var("Py_GIL_DISABLED"))
+    gil_enabled = sys._is_gil_enabled() if hasattr(sys, "_is_gil_enabled") else True
+    build = f"Python {sys.version.split()[0]}{' free-threaded' if free_threaded else ''}, GIL {'on' if gil_enabled else 'off'}"
+    print(f"\n=== Batch scaling, threads ({len(posts)} posts, {os.cpu_count()} CPUs, {build}) ===")
+    _batch_scaling(ner, posts, args, "thread")
+    if ner.improved:
+        _fuzzy_hit_scaling(ner, posts, args)
+
+    # On a free-threaded build, rerun the suite with the GIL forced back on for comparison
+    if free_threaded and not gil_enabled:
+        cmd = [sys.executable, os.path.abspath(__file__), "--suite", "threads", "--input", args.input,
+               "--limit", str(args.limit), "--repeat", str(args.repeat), "--workers", str(args.workers)]
+        if args.chunksize:
+            cmd += ["--chunksize", str(args.chunksize)]
+        if not args.improved:
+            cmd.append("--baseline")
+        subprocess.run(cmd, env=dict(os.environ, PYTHON_GIL="1"), check=False)
+
+
+def _fuzzy_hit_scaling(ner, posts, args):
+    """Time 1..N threads on the fuzzy hot path (gate, then warm memo hits) and check the counters add up."""
+    import re
+    import threading
+    words = [w for p in posts for w in re.findall(r"[a-z]{4,}", p.lower())]
+    for word in set(words):
+        ner._fuzzy_match(word)  # warm the memo: every lookup below is gated or a hit
+
+    def run(threads):
+        workers = [threading.Thread(target=lambda: [ner._fuzzy_match(w) for w in words]) for _ in range(threads)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+
+    def lookups():
+        stats = ner.fuzzy_cache_stats()
+        return stats["hits"] + stats["misses"] + stats["gated"]
+
+    print(f"\n  Fuzzy hot path, warm memo ({len(words)} words per thread)")
+    max_threads = args.workers or os.cpu_count() or 1
+    consistent, base_rate = True, None
+    for threads in range(1, max_threads + 1):
+        before = lookups()
+        elapsed, _ = time_call(run, threads)
+        consistent = consistent and lookups() - before == threads * len(words)
+        rate = threads * len(words) / elapsed if elapsed > 0 else float('inf')
+        base_rate = base_rate or rate
+        print(f"  {f'{threads} threads ({rate / base_rate:.2f}x)':<28} {elapsed * 1000:10.1f} ms  {rate:12.0f} words/s")
+    print("  Per-thread counters add up." if consistent else "  [!] Fuzzy counters lost lookups across threads.")
+
+
+# Engine and misspelled words inherited by the forked workers of the memory benchmark
+_MEMORY_ENGINE = None
+_MEMORY_WORDS = []
+
+
+def _private_dirty_kb():
+    with open("/proc/self/smaps_rollup") as f:
+        return sum(int(line.split()[1]) for line in f if line.startswith("Private_Dirty:"))
+
+
+def _dirtied_kb_after_work(texts):
+    """Extract `texts` and fuzzy-match the misspelled words in a forked worker; return KB un-shared."""
+    before = _private_dirty_kb()
+    for text in texts:
+        _MEMORY_ENGINE.extract(text)
+    for word in _MEMORY_WORDS:
+        _MEMORY_ENGINE._fuzzy_match(word)
+    return _private_dirty_kb() - before
+
+
+def bench_memory(posts, args):
+    """Memory each forked worker un-shares: per-process lexicon objects vs the shared flat lexicon."""
+    global _MEMORY_ENGINE, _MEMORY_WORDS
+    import gc
+    import multiprocessing
+    import random
+    if not os.path.exists("/proc/self/smaps_rollup"):
+        print("\n=== Worker memory: skipped (needs /proc/self/smaps_rollup) ===")
+        return
+    max_workers = args.workers or os.cpu_count() or 1
+
+    for label, shared in (("dict lexicon", False), ("shared lexicon", True)):
+        _MEMORY_ENGINE = OntologyNER(improved=args.improved, shared_lexicon=shared)
+        if not _MEMORY_WORDS:
+            # A long-running ingest sees far more distinct words than the benchmark posts:
+            # one-letter misspellings of dictionary terms reach most of the fuzzy index
+            rng = random.Random(0)
+            terms = [t for t in _MEMORY_ENGINE.sorted_terms if len(t) >= 5]
+            for _ in range(args.vocab):
+                term = rng.choice(terms)
+                i = rng.randrange(1, len(term))
+                _MEMORY_WORDS.append(term[:i] + rng.choice("abcdefghijklmnopqrstuvwxyz") + term[i + 1:])
+            print(f"\n=== Worker memory ({len(posts)} posts + {len(_MEMORY_WORDS)} misspellings per worker) ===")
+        gc.freeze()
+        for workers in range(1, max_workers + 1):
+            with multiprocessing.get_context("fork").Pool(workers) as pool:
+                sizes = pool.map(_dirtied_kb_after_work, [posts] * workers, 1)
+            print(f"  {label + f' x{workers}':<28} {sum(sizes) / len(sizes) / 1024:10.1f} MB un-shared/worker"
+                  f"  {sum(sizes) / 1024:10.1f} MB total")
+        gc.unfreeze()
+        _MEMORY_ENGINE = None
+    _MEMORY_WORDS = []
+
+
+SUITES = {
+    "pass1": bench_pass1,
+    "pass2": bench_pass2,
+    "tokens": bench_tokens,
+    "casefold": bench_casefold,
+    "gating": bench_gating,
+    "eval": bench_eval,
+    "context": bench_context,
+    "spans": bench_spans,
+    "emoji": bench_emoji,
+    "matches": bench_matches,
+    "aggregate": bench_aggregate,
+    "triage": bench_triage,
+    "startup": bench_startup,
+    "update": bench_update,
+    "concat": bench_concat,
+    "scaling": bench_scaling,
+    "threads": bench_threads,
+    "memory": bench_memory,
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="NER engine benchmarks")
+    parser.add_argument("--suite", choices=sorted(SUITES) + ["all"], default="all", help="Benchmark suite to run")
+    parser.add_argument("--input", type=str, default="DATA/dreaddit-train.csv", help="Input CSV file")
+    parser.add_argument("--limit", type=int, default=200, help="Number of posts to benchmark (0 = all)")
+    parser.add_argument("--repeat", type=int, default=1, help="Repetitions per timing (best is reported)")
+    parser.add_argument("--annotations", type=str, default="evaluation/ner_annotation_task.csv", help="Gold annotations for recall checks")
+    parser.add_argument("--paste-kb", type=int, default=100, help="Paste size for the long-post span benchmark")
+    parser.add_argument("--emoji-table", type=int, default=500, help="Grown emoji table size for the emoji benchmark")
+    parser.add_argument("--concepts", type=str, default="HP:5200330", help="Comma-separated concept IDs for the triage benchmark")
+    parser.add_argument("--workers", type=int, default=0, help="Largest worker count for the scaling benchmark (0 = CPU count)")
+    parser.add_argument("--vocab", type=int, default=5000, help="Misspelled words per worker for the memory benchmark")
+    parser.add_argument("--chunksize", type=int, default=None, help="Posts per worker task for the scaling benchmark")
+    parser.add_argument("--baseline", dest="improved", action="store_false", help="Benchmark the baseline term set")
+    args = parser.parse_args()
+
+    posts = load_posts(args.input, args.limit)
+    suites = sorted(SUITES) if args.suite == "all" else [args.suite]
+    for name in suites:
+        SUITES[name](posts, args)
+
+
+if __name__ == "__main__":
+    main()
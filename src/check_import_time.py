@@ -0,0 +1,73 @@
+"""
+Import-time budget check for the NER modules.
+
+Usage:
+    python src/check_import_time.py
+    python src/check_import_time.py --budget-ms 100 --repeat 5
+
+Imports each module in a fresh interpreter under `python -X importtime`,
+reports its cumulative import time (best of --repeat runs) and exits with
+status 1 if a module exceeds the budget or pulls in one of the heavy
+dependencies that must only be imported when used (NLTK for the WordNet
+fallback, owlready2 for parsing the OWL file, pandas for reading CSVs).
+"""
+import argparse
+import os
+import subprocess
+import sys
+
+REPO_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+MODULES = ["src.ner_engine", "src.ner_artifact", "src.lemma_table", "src.pipeline", "src.run_eval"]
+DEFERRED = ["nltk", "owlready2", "pandas"]
+
+
+def measure(module, deferred=DEFERRED):
+    """Return (cumulative import time in ms, deferred modules it imported) in a fresh interpreter."""
+    code = f"import sys, {module}; print(','.join(m for m in {list(deferred)!r} if m in sys.modules))"
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", code],
+                          cwd=REPO_ROOT, capture_output=True, text=True)
+    if proc.returncode != 0:
+        raise RuntimeError(f"importing {module} failed: {proc.stderr.strip().splitlines()[-1]}")
+
+    cumulative_us = None
+    # Lines look like "import time:  self [us] | cumulative | imported package"
+    for line in proc.stderr.splitlines():
+        fields = line.split('|')
+        if len(fields) == 3 and fields[2].strip() == module:
+            cumulative_us = int(fields[1])
+    if cumulative_us is None:
+        raise RuntimeError(f"no -X importtime entry for {module}")
+    loaded = [m for m in proc.stdout.strip().split(',') if m]
+    return cumulative_us / 1000, loaded
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check import times of the NER modules")
+    parser.add_argument("--modules", type=str, default=",".join(MODULES), help="Comma-separated modules to check")
+    parser.add_argument("--budget-ms", type=float, default=100.0, help="Maximum cumulative import time per module")
+    parser.add_argument("--repeat", type=int, default=3, help="Fresh imports per module (best is reported)")
+    args = parser.parse_args()
+
+    failures = 0
+    for module in args.modules.split(","):
+        runs = [measure(module) for _ in range(max(args.repeat, 1))]
+        best = min(ms for ms, _ in runs)
+        loaded = sorted(set(m for _, mods in runs for m in mods))
+        problems = []
+        if best > args.budget_ms:
+            problems.append(f"over budget ({args.budget_ms:.0f} ms)")
+        if loaded:
+            problems.append(f"imports {', '.join(loaded)}")
+        status = "FAIL: " + "; ".join(problems) if problems else "ok"
+        print(f"  {module:<24} {best:8.1f} ms  {status}")
+        failures += bool(problems)
+
+    if failures:
+        print(f"{failures} module(s) failed the import check.")
+        sys.exit(1)
+    print("All modules within the import budget.")
+
+
+if __name__ == "__main__":
+    main()
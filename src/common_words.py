@@ -0,0 +1,125 @@
+"""
+Frequent-word gate for the fuzzy matching pass.
+
+Words in this set are never sent to the fuzzy matcher. The set is built
+offline from the Dreaddit corpus plus a general word list:
+
+    python src/common_words.py --input DATA/dreaddit-train.csv --top 5000
+
+and loaded by OntologyNER at init. Words that are dictionary terms, or that
+currently produce a fuzzy hit, are excluded so gating does not drop any
+symptom mention unless --include-fuzzy-hits is given.
+"""
+import argparse
+import os
+import re
+import sys
+from collections import Counter
+
+COMMON_WORDS_PATH = "DATA/common_words.txt"
+
+# General English word list (4+ letters, fuzzy matching ignores shorter words).
+# Used on its own when no corpus-built list is available.
+BUILTIN_COMMON_WORDS = frozenset("""
+able about above across actually after again against almost alone along already also although always among
+another anyone anything anyway anywhere around away back became because become been before began behind being
+believe below best better between both bring brought call called came cannot cant care case change come comes
+coming could couldnt course daily date didn didnt different does doesn doesnt doing done dont during each early
+either else enough even ever every everyone everything exactly except fact family find first five four friend
+friends from front full gave getting give given gives going gone good got gotten great guess guys hadn hadnt half
+happen happened hasn hasnt have haven havent having hear heard help here hers herself high himself home hour hours
+house however idea into isnt itself just keep kind knew know known last late later least left less life like
+likely line little live long look looking looks lot lots made main make makes making many maybe mean means meant
+might mine minute minutes mom money month months more most mostly much must myself name need needed needs never
+next nice night none normal nothing number often okay once only onto open other others ours ourselves over own
+part past people person place plan play point pretty probably put quite rather read ready real really reason
+recently right said same saying says school second seem seemed seems seen several shall should shouldnt show
+since small some someone something sometimes soon sort still stuff such sure take taken takes taking talk talked
+talking tell than thank thanks that thats their theirs them themselves then there theres these they thing things
+think thinking this those though thought three through time times today together told took toward town tried
+tries truly trying turn under until upon used using usually very wait want wanted wants wasn wasnt watch week
+weeks well went were werent what whatever when where whether which while whole whom whose will wish with within
+without wont word words work worked working world would wouldnt wrong year years yeah young your yours yourself
+""".split())
+
+
+def load_common_words(path=COMMON_WORDS_PATH):
+    """Load the gate word set from `path`, falling back to the built-in list."""
+    if os.path.exists(path):
+        with open(path, 'r', encoding='utf-8') as f:
+            words = {line.strip().lower() for line in f if line.strip() and not line.startswith('#')}
+        print(f"Loaded {len(words)} common words for fuzzy gating from {path}")
+        return frozenset(words)
+    return BUILTIN_COMMON_WORDS
+
+
+def build_common_words(texts, ner, top=5000, extra_words=(), include_fuzzy_hits=False):
+    """
+    Build the gate set from corpus word frequencies plus `extra_words`.
+
+    Returns (words, excluded) where `excluded` lists the frequent words that
+    were kept out because they are dictionary terms or fuzzy-match a term.
+    """
+    counts = Counter()
+    for text in texts:
+        counts.update(w.lower() for w in re.findall(r'\b\w{4,}\b', text))
+
+    candidates = [w for w, _ in counts.most_common(top)]
+    candidates.extend(w.lower() for w in extra_words if len(w) >= 4)
+
+    words, excluded = set(), []
+    for word in dict.fromkeys(candidates):
+        if word in ner.term_to_id:
+            excluded.append((word, "term"))
+            continue
+        if not include_fuzzy_hits:
+            hit = ner.fuzzy_index.lookup(word, ner.fuzzy_threshold)
+            if hit is not None:
+                excluded.append((word, f"fuzzy:{hit}"))
+                continue
+        words.add(word)
+    return words, excluded
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build the frequent-word gate for fuzzy matching")
+    parser.add_argument("--input", type=str, default="DATA/dreaddit-train.csv", help="Corpus CSV with a 'text' column")
+    parser.add_argument("--output", type=str, default=COMMON_WORDS_PATH, help="Output word list")
+    parser.add_argument("--top", type=int, default=5000, help="Number of most frequent corpus words to consider")
+    parser.add_argument("--wordlist", type=str, default=None, help="Optional general word list (one word per line)")
+    parser.add_argument("--include-fuzzy-hits", action="store_true", help="Also gate frequent words that fuzzy-match a term")
+    args = parser.parse_args()
+
+    import pandas as pd
+    sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+    try:
+        from src.ner_engine import OntologyNER
+    except ImportError:
+        from ner_engine import OntologyNER
+
+    df = pd.read_csv(args.input)
+    texts = [str(t) for t in df['text'].fillna('')]
+
+    extra = set(BUILTIN_COMMON_WORDS)
+    if args.wordlist:
+        with open(args.wordlist, 'r', encoding='utf-8') as f:
+            extra.update(line.strip() for line in f if line.strip())
+
+    # Build against an ungated engine so existing fuzzy hits are visible
+    ner = OntologyNER(improved=True, common_words_path=None)
+    words, excluded = build_common_words(texts, ner, args.top, sorted(extra), args.include_fuzzy_hits)
+
+    os.makedirs(os.path.dirname(args.output) or ".", exist_ok=True)
+    with open(args.output, 'w', encoding='utf-8') as f:
+        f.write(f"# Fuzzy gate words built from {args.input} (top {args.top}) + general word list\n")
+        for word in sorted(words):
+            f.write(word + "\n")
+
+    print(f"Wrote {len(words)} gate words to {args.output}")
+    print(f"Excluded {len(excluded)} frequent words (dictionary terms or fuzzy hits), e.g.:")
+    for word, reason in excluded[:20]:
+        print(f"  {word:<20} {reason}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+try:
+    from src.matchers import WORD_RE, TokenStream, has_fold_mappings
+    from src.fuzzy_index import FuzzyIndex
+except ImportError:
+    from matchers import WORD_RE, TokenStream, has_fold_mappings
+    from fuzzy_index import FuzzyIndex
+
+
+class ConceptPrefilter:
+    """
+    Cheap proof that a post cannot produce a match for a set of concepts.
+
+    Used by OntologyNER.has_any()/first_match()/iter_extract() with
+    concept_ids (passed in as concept codes, see concepts.py), so negative
+    posts skip the full passes. Each check is a necessary condition for a
+    candidate of the target concepts, so a post that fails all of them has
+    no such match; anything else goes through the exact extraction path.
+
+      - Pass 0: a target emoji occurs in the text.
+      - Pass 1: the post's token set contains every token of a term that
+        resolves (via the plural strip or lemma) to a target concept, the
+        last one possibly with a plural 's'.
+      - Pass 1.5: a non-gated word fuzzy-matches a target term (cached
+        fuzzy results are reused, otherwise a small index over the target
+        terms is queried).
+      - Pass 2: an anchored target pattern is active and matches.
+    """
+
+    def __init__(self, ner, lexicon, concept_codes):
+        self.ner = ner
+        self.lexicon = lexicon  # the engine's LexiconCore this prefilter was built for
+        self.concept_codes = frozenset(concept_codes)
+        targets = self.concept_codes
+
+        self.emoji = [e for e, code in lexicon.emoji_codes.items() if code in targets]
+
+        # Pass 1: first token -> (other leading tokens, last token, plural last token) per target term
+        self.term_tokens = {}
+        self.pass1_unfiltered = False
+        for term, code in ner.pass1_term_concepts(lexicon).items():
+            if code not in targets:
+                continue
+            tokens = WORD_RE.findall(term)
+            if not tokens or not (WORD_RE.match(term[0]) and WORD_RE.match(term[-1])):
+                self.pass1_unfiltered = True  # irregular term, matched by regex anywhere
+                continue
+            entry = (frozenset(tokens[1:-1]), tokens[-1], tokens[-1] + 's')
+            keys = [tokens[0]] if len(tokens) > 1 else [tokens[0], tokens[0] + 's']
+            for key in keys:
+                self.term_tokens.setdefault(key, []).append(entry)
+
+        # Pass 1.5: fuzzy results are the best term overall, so they can only be target terms
+        self.fuzzy_index = None
+        self.fuzzy_keys = set()
+        if ner.improved:
+            fuzzy_terms = [t for t in lexicon.sorted_terms if lexicon.term_to_id.get(t) in targets]
+            self.fuzzy_index = FuzzyIndex(fuzzy_terms)
+            delta = self.fuzzy_index.max_length_delta
+            for first, length in self.fuzzy_index.partitions:
+                for a in range(length - delta, length + delta + 1):
+                    self.fuzzy_keys.add((first, a))
+
+        # Pass 2: target patterns and whether their anchors can rule them out
+        self.patterns = [i for i, code in enumerate(lexicon.pass2_codes) if code in targets] if ner.improved else []
+
+    def may_match(self, text, tokens=None):
+        """False only if `text` (tokenized as `tokens`, if given) cannot yield a match of the target concepts."""
+        ner, lexicon = self.ner, self.lexicon
+        if has_fold_mappings(text):
+            return True  # str.lower() and the folded text disagree; stay exact
+        if any(e in text for e in self.emoji):
+            return True
+
+        if self.pass1_unfiltered:
+            return True
+        if tokens is None:
+            tokens = TokenStream(text)
+        word_set = tokens.word_set
+        for first in self.term_tokens.keys() & word_set:
+            for middle, last, plural in self.term_tokens[first]:
+                if middle <= word_set and (last in word_set or plural in word_set):
+                    return True
+
+        if self.patterns:
+            scanner = lexicon.pass2_scanner
+            active = scanner.active_patterns(word_set)
+            folded = tokens.folded
+            if any(scanner.compiled[i].search(folded if scanner.on_folded[i] else text)
+                   for i in self.patterns if i in active):
+                return True
+
+        if self.fuzzy_index is not None and self.fuzzy_keys:
+            targets = self.concept_codes
+            plain = tokens.plain
+            for k, word in enumerate(tokens.words):
+                if len(word) < 4:
+                    continue
+                if not plain:
+                    word = text[tokens.starts[k]:tokens.ends[k]].lower()
+                if (word[0], len(word)) not in self.fuzzy_keys or word in lexicon.common_words:
+                    continue
+                cached = lexicon.fuzzy_memo.peek(word)
+                if cached is not lexicon.fuzzy_memo.MISSING:
+                    if cached in targets:
+                        return True
+                elif self.fuzzy_index.lookup(word, ner.fuzzy_threshold) is not None:
+                    return True
+        return False
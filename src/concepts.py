@@ -0,0 +1,61 @@
+"""
+Process-wide registry of interned concept codes.
+
+Concept IDs ("HP:0100852", "MANUAL_LEX:SADNESS", ...) are mapped to dense
+integer codes the first time they are seen, normally while OntologyNER
+loads its lexicon. The NER core, match storage, deduplication and KG
+aggregation work on the codes; the ID strings are only looked up again
+when results are exported (Match.id, to_dict(), KG export).
+
+Codes are stable for the lifetime of the process and shared by every
+engine in it, including forked workers. They are not stable across
+processes, so anything persisted stores the ID strings.
+"""
+import threading
+from array import array
+
+
+class ConceptRegistry:
+    """Dense integer code per concept ID, assigned on first sight and never reused."""
+
+    def __init__(self):
+        self.ids = []
+        self._codes = {}
+        self._lock = threading.Lock()
+
+    def code(self, concept_id):
+        """Code of `concept_id`, registering it if it is new."""
+        code = self._codes.get(concept_id)
+        if code is None:
+            with self._lock:
+                code = self._codes.get(concept_id)
+                if code is None:
+                    code = self._codes[concept_id] = len(self.ids)
+                    self.ids.append(concept_id)
+        return code
+
+    def lookup(self, concept_id):
+        """Code of `concept_id`, or None if it was never registered."""
+        return self._codes.get(concept_id)
+
+    def codes(self, concept_ids):
+        """array('i') of the codes of `concept_ids`, registering new ones."""
+        return array('i', [self.code(c) for c in concept_ids])
+
+    def concept_id(self, code):
+        return self.ids[code]
+
+    def intern_values(self, mapping):
+        """Copy of `mapping` with its concept ID values replaced by codes (None values are kept)."""
+        codes = {c: self.code(c) for c in set(mapping.values()) if c is not None}
+        codes[None] = None
+        return {key: codes[c] for key, c in mapping.items()}
+
+    def __contains__(self, concept_id):
+        return concept_id in self._codes
+
+    def __len__(self):
+        return len(self.ids)
+
+
+CONCEPTS = ConceptRegistry()
@@ -0,0 +1,186 @@
+import re
+from bisect import bisect_left
+from typing import Dict, List
+
+try:
+    from src.matchers import WORD_RE, TokenStream
+except ImportError:
+    from matchers import WORD_RE, TokenStream
+
+# Cue phrases. Words separated by a space match any whitespace run (\s+);
+# punctuation inside a word ("don't") must match literally.
+# Each negation group names what has to follow the phrase:
+#   "ws"         -> at least one whitespace character      (phrase\s+)
+#   "ws_word_ws" -> whitespace, a word, whitespace         (phrase\s+\w+\s+)
+NEGATION_CUES = [
+    (["not", "no", "never", "neither", "nor", "none", "nobody", "nothing", "nowhere"], "ws_word_ws"),
+    (["don't", "doesn't", "didn't", "won't", "wouldn't", "can't", "cannot", "couldn't"], "ws"),
+    (["no longer", "not anymore", "stopped being"], "ws"),
+    (["without", "lacking", "absent"], "ws"),
+]
+
+# Temporal/intensity markers are whole-word phrases, checked in priority order
+TEMPORAL_MARKERS = [
+    ("past", ["used to", "was", "were", "had", "did", "ago", "before", "previously"]),
+    ("present", ["am", "is", "are", "currently", "now", "right now", "these days"]),
+    ("future", ["will", "going to", "gonna", "might", "may", "could"]),
+]
+INTENSITY_MARKERS = [
+    ("high", ["very", "extremely", "really", "so", "super", "incredibly", "unbearably"]),
+    ("low", ["a bit", "slightly", "somewhat", "kind of", "sort of", "a little"]),
+]
+
+NEGATION_WINDOW = 30
+TEMPORAL_WINDOW = 40
+INTENSITY_WINDOW = 30
+
+_TAILS = {"ws": r"\s+", "ws_word_ws": r"\s+\w+\s+", "boundary": r"\b"}
+# Shortest text the tail can match, used for an occurrence's minimal end
+_MIN_TAILS = {"ws": r"\s", "ws_word_ws": r"\s+\w+\s", "boundary": r"\b"}
+
+
+_WORD_PAIR_RE = re.compile(r"\w\w")
+
+
+def _phrase_pattern(phrase):
+    return r"\s+".join(re.escape(word) for word in phrase.split())
+
+
+class ContextAnnotator:
+    """
+    One-pass negation, temporal and intensity cue detection.
+
+    The original checks sliced a 30-40 character window around every match
+    and ran about ten regex searches on it. Here the post's tokens are looked
+    up once in a table of the first words of all cue phrases, every cue
+    occurrence is recorded in sorted arrays per family, and a match resolves
+    its cues with a bisect.
+
+    The window semantics are kept exactly. A window that starts or ends in
+    the middle of a word can expose a cue the whole post does not contain
+    ("piano" cut to "no"); those rare windows are searched directly.
+    """
+
+    def __init__(self):
+        groups = [("negation", phrases, trailing) for phrases, trailing in NEGATION_CUES]
+        groups += [(label, phrases, "boundary") for label, phrases in TEMPORAL_MARKERS + INTENSITY_MARKERS]
+
+        self.families = list(dict.fromkeys(family for family, _, _ in groups))
+        # family -> regexes equivalent to the original per-window searches
+        self.window_regexes: Dict[str, List] = {family: [] for family in self.families}
+        # family -> first words of its phrases (a window cut inside a word only matters for these)
+        self.first_words: Dict[str, set] = {family: set() for family in self.families}
+        # first word -> [(family, anchored regex giving the occurrence's minimal end)]
+        self.by_first_word: Dict[str, List] = {}
+
+        for family, phrases, trailing in groups:
+            alternation = "|".join(_phrase_pattern(p) for p in phrases)
+            self.window_regexes[family].append(re.compile(rf"\b(?:{alternation}){_TAILS[trailing]}"))
+            for phrase in phrases:
+                first = WORD_RE.match(phrase).group()
+                self.first_words[family].add(first)
+                anchored = re.compile(_phrase_pattern(phrase) + _MIN_TAILS[trailing])
+                self.by_first_word.setdefault(first, []).append((family, anchored))
+
+    def annotate(self, text, spans=None, tokens=None):
+        """
+        Scan `text` once and return a PostContext for per-match cue lookups.
+
+        If the (start, end) spans of the matches are given, only the tokens
+        their context windows cover are looked up. `tokens` may pass in the
+        post's TokenStream when the caller already has it.
+        """
+        return PostContext(self, text, spans, tokens)
+
+
+class PostContext:
+    """Cue occurrences of one post, queried per match by character offsets."""
+
+    def __init__(self, annotator, text, spans=None, tokens=None):
+        self.annotator = annotator
+        if tokens is None:
+            tokens = TokenStream(text)
+        # fold_case keeps offsets and mirrors re.IGNORECASE, so patterns stay case-sensitive
+        self.folded = folded = tokens.folded
+
+        found = {family: [] for family in annotator.families}
+        by_first_word = annotator.by_first_word
+        words, starts = tokens.words, tokens.starts
+        for region_start, region_end in _window_regions(spans, len(folded)):
+            # A cue word running past region_end could only end past every window in the region
+            lo, hi = tokens.between(region_start, region_end)
+            for k in range(lo, hi):
+                cues = by_first_word.get(words[k])
+                if cues is None:
+                    continue
+                start = starts[k]
+                for family, anchored in cues:
+                    cue = anchored.match(folded, start)
+                    if cue is not None:
+                        found[family].append((start, cue.end()))
+
+        # family -> (occurrence starts, suffix minima of occurrence ends)
+        self.occurrences = {}
+        for family, occ in found.items():
+            occ.sort()
+            starts = [s for s, _ in occ]
+            min_ends = [e for _, e in occ]
+            for k in range(len(min_ends) - 2, -1, -1):
+                if min_ends[k + 1] < min_ends[k]:
+                    min_ends[k] = min_ends[k + 1]
+            self.occurrences[family] = (starts, min_ends)
+
+    def has_cue(self, family, window_start, window_end):
+        """True if a `family` cue matches inside text[window_start:window_end]."""
+        starts, min_ends = self.occurrences[family]
+        k = bisect_left(starts, window_start)
+        if k < len(starts) and min_ends[k] <= window_end:
+            return True
+        if self._cuts_cue(family, window_start, window_end):
+            window = self.folded[window_start:window_end]
+            return any(regex.search(window) for regex in self.annotator.window_regexes[family])
+        return False
+
+    def _cuts_cue(self, family, window_start, window_end):
+        folded = self.folded
+        # Window end inside a word: the truncated word is a new candidate (rare, matches end at word ends)
+        if window_end > 0 and _WORD_PAIR_RE.match(folded, window_end - 1, window_end + 1) is not None:
+            return True
+        # Window start inside a word: only matters if the cut-off tail is a cue's first word
+        if window_start > 0 and _WORD_PAIR_RE.match(folded, window_start - 1, window_start + 1) is not None:
+            tail = WORD_RE.match(folded, window_start, window_end)
+            return tail is not None and tail.group() in self.annotator.first_words[family]
+        return False
+
+    def negated(self, start):
+        return self.has_cue("negation", max(0, start - NEGATION_WINDOW), start)
+
+    def temporal(self, start, end):
+        window_start = max(0, start - TEMPORAL_WINDOW)
+        for label, _ in TEMPORAL_MARKERS:
+            if self.has_cue(label, window_start, end):
+                return label
+        return "present"  # Default
+
+    def intensity(self, start):
+        window_start = max(0, start - INTENSITY_WINDOW)
+        for label, _ in INTENSITY_MARKERS:
+            if self.has_cue(label, window_start, start):
+                return label
+        return "medium"
+
+
+def _window_regions(spans, length):
+    """Merged text regions covered by the context windows of `spans`."""
+    if spans is None:
+        return [(0, length)]
+    window = max(NEGATION_WINDOW, TEMPORAL_WINDOW, INTENSITY_WINDOW)
+    regions = []
+    for start, end in sorted(spans):
+        start = max(0, start - window)
+        if regions and start <= regions[-1][1]:
+            if end > regions[-1][1]:
+                regions[-1][1] = end
+        else:
+            regions.append([start, end])
+    return regions
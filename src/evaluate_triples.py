@@ -1,6 +1,6 @@
-import pandas as pd
-
 def evaluate_triples_closed_world():
+    import pandas as pd
+    
     # 1. Load KG Nodes for mapping ID -> Name and for Support Counts
     nodes_df = pd.read_csv("KG/nodes.csv")
     node_id_to_name = dict(zip(nodes_df['id'], nodes_df['name']))
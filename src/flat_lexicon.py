@@ -0,0 +1,328 @@
+"""
+Flat, memory-mapped encoding of the NER lexicon for multi-process extraction.
+
+Forked workers start out sharing the engine with the parent, but every
+dictionary lookup writes reference counts into the objects it touches, so
+the pages holding term_to_id, the Pass 1 term set and above all the fuzzy
+index postings are gradually copied into each worker.
+
+FlatLexicon stores those structures as a handful of flat buffers (UTF-8
+string blobs, int32 offset/code/posting arrays and open-addressing hash
+slots) in one read-only mmap. The mmap is backed by a file next to the NER
+artifact, so every worker (forked, spawned or a separate process) maps the
+same page-cache pages, or by anonymous shared memory when no artifact
+directory is used. Nothing in it is a Python object, so lookups never dirty
+those pages and per-worker memory stays flat as workers are added.
+"""
+import json
+import mmap
+import os
+import zlib
+from array import array
+from collections.abc import Mapping, Sequence
+
+try:
+    from src.concepts import CONCEPTS
+    from src.fuzzy_index import FuzzyIndex
+except ImportError:
+    from concepts import CONCEPTS
+    from fuzzy_index import FuzzyIndex
+
+FLAT_LEXICON_VERSION = 1
+_MAGIC = b"NERFLAT1"
+
+
+class FlatStringTable:
+    """Read-only hash table over strings stored in a blob; maps a string to its row."""
+
+    def __init__(self, blob, offsets, slots):
+        self.blob = blob
+        self.offsets = offsets
+        self.slots = slots
+        self.mask = len(slots) - 1
+
+    @staticmethod
+    def encode(keys):
+        """(blob, offsets, slots) buffers for the distinct strings `keys`, row i = keys[i]."""
+        encoded = [k.encode('utf-8') for k in keys]
+        offsets = array('i', [0])
+        for data in encoded:
+            offsets.append(offsets[-1] + len(data))
+        size = 1
+        while size < 2 * len(encoded):
+            size *= 2
+        slots = array('i', [-1]) * size
+        mask = size - 1
+        for row, data in enumerate(encoded):
+            h = zlib.crc32(data) & mask
+            while slots[h] >= 0:
+                h = (h + 1) & mask
+            slots[h] = row
+        return b"".join(encoded), offsets, slots
+
+    def index(self, key):
+        """Row of `key`, or -1."""
+        data = key.encode('utf-8')
+        blob, offsets, slots, mask = self.blob, self.offsets, self.slots, self.mask
+        h = zlib.crc32(data) & mask
+        while True:
+            row = slots[h]
+            if row < 0:
+                return -1
+            if blob[offsets[row]:offsets[row + 1]] == data:
+                return row
+            h = (h + 1) & mask
+
+    def key(self, row):
+        return str(self.blob[self.offsets[row]:self.offsets[row + 1]], 'utf-8')
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+
+class FlatTermTable(Mapping):
+    """term -> concept code view over the flat lexicon, a drop-in for the term_to_id dict."""
+
+    def __init__(self, table, codes, concepts):
+        self.table = table
+        self.codes = codes
+        self.concepts = concepts  # file-local concept index -> ConceptRegistry code
+
+    def get(self, term, default=None):
+        row = self.table.index(term)
+        return self.concepts[self.codes[row]] if row >= 0 else default
+
+    def __getitem__(self, term):
+        row = self.table.index(term)
+        if row < 0:
+            raise KeyError(term)
+        return self.concepts[self.codes[row]]
+
+    def __contains__(self, term):
+        return self.table.index(term) >= 0
+
+    def __len__(self):
+        return len(self.table)
+
+    def __iter__(self):
+        return (self.table.key(row) for row in range(len(self.table)))
+
+
+class FlatTermSet:
+    """Membership view of the terms flagged in `flags` (the Pass 1 token-matcher term set)."""
+
+    def __init__(self, table, flags):
+        self.table = table
+        self.flags = flags
+
+    def __contains__(self, term):
+        row = self.table.index(term)
+        return row >= 0 and self.flags[row] == 1
+
+    def __len__(self):
+        return sum(self.flags)
+
+    def __iter__(self):
+        return (self.table.key(row) for row in range(len(self.table)) if self.flags[row] == 1)
+
+
+class FlatTermList(Sequence):
+    """The dictionary terms, longest first, decoded on access (the sorted_terms list)."""
+
+    def __init__(self, table):
+        self.table = table
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self.table.key(row) for row in range(len(self.table))[i]]
+        if i < 0:
+            i += len(self.table)
+        if not 0 <= i < len(self.table):
+            raise IndexError(i)
+        return self.table.key(i)
+
+    def __len__(self):
+        return len(self.table)
+
+
+class FlatFuzzyIndex(FuzzyIndex):
+    """FuzzyIndex whose partitions and bigram postings live in the flat lexicon."""
+
+    def __init__(self, lexicon, max_length_delta):
+        self.max_length_delta = max_length_delta
+        self.lexicon = lexicon
+
+    @property
+    def partitions(self):
+        lex = self.lexicon
+        keys = (lex.partition_table.key(p).split("\0") for p in range(len(lex.partition_table)))
+        return {(first, int(length)): _FlatPartition(lex, p)
+                for p, (first, length) in enumerate(keys)}
+
+    def _partition(self, first, length):
+        p = self.lexicon.partition_table.index(f"{first}\0{length}")
+        return _FlatPartition(self.lexicon, p) if p >= 0 else None
+
+
+class _FlatPartition(tuple):
+    """(terms, postings) of one fuzzy partition, unpacked like FuzzyIndex's tuples."""
+
+    def __new__(cls, lexicon, p):
+        return super().__new__(cls, (_FlatPartitionTerms(lexicon, p), _FlatPostings(lexicon, p)))
+
+
+class _FlatPartitionTerms(Sequence):
+    def __init__(self, lexicon, p):
+        self.lexicon = lexicon
+        self.start = lexicon.part_starts[p]
+        self.stop = lexicon.part_starts[p + 1]
+
+    def __getitem__(self, idx):
+        return self.lexicon.term_table.key(self.lexicon.part_terms[self.start + idx])
+
+    def __len__(self):
+        return self.stop - self.start
+
+
+class _FlatPostings:
+    def __init__(self, lexicon, p):
+        self.lexicon = lexicon
+        self.prefix = f"{p}\0"
+
+    def get(self, bigram, default=()):
+        lex = self.lexicon
+        row = lex.posting_table.index(self.prefix + bigram)
+        if row < 0:
+            return default
+        return lex.postings[lex.posting_starts[row]:lex.posting_starts[row + 1]]
+
+
+class FlatLexicon:
+    """
+    Read-only flat lexicon over a buffer built by FlatLexicon.encode().
+
+    Use FlatLexicon.open() to map (building it first if needed) the file
+    for an artifact, or FlatLexicon.from_bytes() for an anonymous shared
+    mapping.
+    """
+
+    def __init__(self, buffer):
+        self.buffer = buffer
+        view = memoryview(buffer)
+        if bytes(view[:len(_MAGIC)]) != _MAGIC:
+            raise ValueError("not a flat NER lexicon")
+        header_len = int.from_bytes(view[len(_MAGIC):len(_MAGIC) + 8], 'little')
+        header_start = len(_MAGIC) + 8
+        header = json.loads(bytes(view[header_start:header_start + header_len]))
+        if header["version"] != FLAT_LEXICON_VERSION:
+            raise ValueError(f"flat lexicon version {header['version']} != {FLAT_LEXICON_VERSION}")
+
+        sections = {}
+        for name, (typecode, start, length) in header["sections"].items():
+            section = view[start:start + length]
+            sections[name] = section.cast(typecode) if typecode != 'B' else section
+
+        self.concepts = CONCEPTS.codes(header["concepts"])
+        self.term_table = FlatStringTable(sections["term_blob"], sections["term_offsets"], sections["term_slots"])
+        self.term_codes = sections["term_codes"]
+        self.term_to_id = FlatTermTable(self.term_table, self.term_codes, self.concepts)
+        self.sorted_terms = FlatTermList(self.term_table)
+        self.pass1_terms = FlatTermSet(self.term_table, sections["pass1_flags"])
+
+        self.fuzzy_index = None
+        if header["fuzzy_max_length_delta"] is not None:
+            self.partition_table = FlatStringTable(
+                sections["partition_blob"], sections["partition_offsets"], sections["partition_slots"])
+            self.part_starts = sections["part_starts"]
+            self.part_terms = sections["part_terms"]
+            self.posting_table = FlatStringTable(
+                sections["posting_blob"], sections["posting_offsets"], sections["posting_slots"])
+            self.posting_starts = sections["posting_starts"]
+            self.postings = sections["postings"]
+            self.fuzzy_index = FlatFuzzyIndex(self, header["fuzzy_max_length_delta"])
+
+    @staticmethod
+    def encode(term_to_id, sorted_terms, fuzzy_index=None, pass1_terms=()):
+        """Serialize the lexicon into the flat layout; `pass1_terms` is the token matcher's term set."""
+        # term_to_id holds process-local concept codes; the file stores the concept IDs
+        concepts = sorted(CONCEPTS.concept_id(code) for code in set(term_to_id.values()))
+        concept_codes = {CONCEPTS.code(c): i for i, c in enumerate(concepts)}
+        term_rows = {term: row for row, term in enumerate(sorted_terms)}
+        sections = {}
+
+        blob, offsets, slots = FlatStringTable.encode(sorted_terms)
+        sections.update(term_blob=blob, term_offsets=offsets, term_slots=slots,
+                        term_codes=array('i', [concept_codes[term_to_id[t]] for t in sorted_terms]),
+                        pass1_flags=array('b', [t in pass1_terms for t in sorted_terms]))
+
+        if fuzzy_index is not None:
+            partition_keys, part_starts, part_terms = [], array('i', [0]), array('i')
+            posting_keys, posting_starts, postings = [], array('i', [0]), array('i')
+            for p, ((first, length), (terms, bigram_postings)) in enumerate(fuzzy_index.partitions.items()):
+                partition_keys.append(f"{first}\0{length}")
+                part_terms.extend(term_rows[t] for t in terms)
+                part_starts.append(len(part_terms))
+                for bigram, indices in bigram_postings.items():
+                    posting_keys.append(f"{p}\0{bigram}")
+                    postings.extend(indices)
+                    posting_starts.append(len(postings))
+            blob, offsets, slots = FlatStringTable.encode(partition_keys)
+            sections.update(partition_blob=blob, partition_offsets=offsets, partition_slots=slots,
+                            part_starts=part_starts, part_terms=part_terms)
+            blob, offsets, slots = FlatStringTable.encode(posting_keys)
+            sections.update(posting_blob=blob, posting_offsets=offsets, posting_slots=slots,
+                            posting_starts=posting_starts, postings=postings)
+
+        # Sections are 8-byte aligned after the header so casts are aligned
+        layout, chunks, pos = {}, [], 0
+        for name, data in sections.items():
+            raw = data.tobytes() if isinstance(data, array) else data
+            layout[name] = [data.typecode if isinstance(data, array) else 'B', pos, len(raw)]
+            chunks.append(raw + b"\0" * (-len(raw) % 8))
+            pos += len(chunks[-1])
+        header = {
+            "version": FLAT_LEXICON_VERSION,
+            "concepts": concepts,
+            "fuzzy_max_length_delta": fuzzy_index.max_length_delta if fuzzy_index is not None else None,
+            "sections": layout,
+        }
+        # Section offsets are absolute, so the header size and the data start depend on each other
+        base = 0
+        while True:
+            header["sections"] = {name: [tc, base + start, length] for name, (tc, start, length) in layout.items()}
+            header_bytes = json.dumps(header).encode('utf-8')
+            prefix_len = len(_MAGIC) + 8 + len(header_bytes)
+            needed = prefix_len + (-prefix_len % 8)
+            if needed <= base:
+                break
+            base = needed
+        prefix = _MAGIC + len(header_bytes).to_bytes(8, 'little') + header_bytes
+        prefix += b"\0" * (base - len(prefix))
+        return prefix + b"".join(chunks)
+
+    @classmethod
+    def from_bytes(cls, data):
+        """Copy `data` into an anonymous shared mapping (inherited by forked workers)."""
+        buffer = mmap.mmap(-1, len(data))
+        buffer.write(data)
+        return cls(buffer)
+
+    @classmethod
+    def open(cls, path, build):
+        """Map the flat lexicon at `path` read-only, writing build() there first if it is missing or stale."""
+        if os.path.exists(path):
+            try:
+                return cls._map(path)
+            except ValueError as e:
+                print(f"Rebuilding flat lexicon {path}: {e}")
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(build())
+        os.replace(tmp_path, path)
+        return cls._map(path)
+
+    @classmethod
+    def _map(cls, path):
+        with open(path, 'rb') as f:
+            return cls(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ))
@@ -0,0 +1,196 @@
+import math
+import threading
+from collections import Counter, OrderedDict
+from difflib import SequenceMatcher
+
+
+class FuzzyIndex:
+    """
+    Bigram index for misspelling lookup, built once from the dictionary terms.
+
+    Terms are partitioned by (first character, length), matching the original
+    candidate rules (same first letter, length within +/-2). Inside each
+    partition an inverted index maps character bigrams to terms.
+
+    A SequenceMatcher ratio above `threshold` needs at least
+    L = floor(threshold * (a + b) / 2) + 1 matching characters, and those
+    characters keep at least 3L - 1 - a - b bigrams intact in both strings.
+    Only terms sharing that many bigrams with the word are verified with
+    SequenceMatcher, so the lookup is exact without scanning every term.
+    """
+
+    def __init__(self, terms, max_length_delta=2):
+        self.max_length_delta = max_length_delta
+        # (first char, length) -> (terms, {bigram: term indices})
+        self.partitions = {}
+        self._add_terms(terms)
+
+    def share_terms(self, terms):
+        """Swap the index's term strings for the equal ones in `terms`, so an unpickled index holds no copies."""
+        canonical = {term: term for term in terms}
+        for part_terms, _ in self.partitions.values():
+            part_terms[:] = [canonical.get(term, term) for term in part_terms]
+
+    def patched(self, terms, changed):
+        """
+        Index over `terms` that shares every partition with this one except those of the `changed` terms.
+
+        `terms` is the full new term list; the partitions of the added and
+        removed terms are rebuilt from it, so they keep its order.
+        """
+        keys = {(term[0], len(term)) for term in changed if term}
+        index = FuzzyIndex((), self.max_length_delta)
+        index.partitions = {key: part for key, part in self.partitions.items() if key not in keys}
+        index._add_terms(term for term in terms if term and (term[0], len(term)) in keys)
+        return index
+
+    def _add_terms(self, terms):
+        for term in terms:
+            if not term:
+                continue
+            key = (term[0], len(term))
+            part = self.partitions.get(key)
+            if part is None:
+                part = self.partitions[key] = ([], {})
+            part_terms, postings = part
+            idx = len(part_terms)
+            part_terms.append(term)
+            for bigram in set(_bigrams(term)):
+                postings.setdefault(bigram, []).append(idx)
+
+    def lookup(self, word, threshold=0.85):
+        """Return the best term with ratio > threshold for lowercase `word`, or None."""
+        if not word:
+            return None
+        a = len(word)
+        word_bigrams = Counter(_bigrams(word))
+        best_term, best_ratio = None, threshold
+        matcher = SequenceMatcher(None, word)
+
+        for b in range(a - self.max_length_delta, a + self.max_length_delta + 1):
+            part = self._partition(word[0], b)
+            if part is None:
+                continue
+            part_terms, postings = part
+
+            # Rounded down a hair so float error can only loosen the filter
+            min_matching = math.floor(threshold * (a + b) / 2 - 1e-9) + 1
+            if min_matching > min(a, b):
+                continue  # ratio above threshold is impossible at this length
+            min_shared = 3 * min_matching - 1 - a - b
+
+            if min_shared <= 0:
+                candidates = range(len(part_terms))
+            else:
+                shared = {}
+                for bigram, count in word_bigrams.items():
+                    for idx in postings.get(bigram, ()):
+                        shared[idx] = shared.get(idx, 0) + count
+                candidates = sorted(idx for idx, n in shared.items() if n >= min_shared)
+
+            for idx in candidates:
+                term = part_terms[idx]
+                matcher.set_seq2(term)
+                ratio = matcher.ratio()
+                if ratio > best_ratio:
+                    best_ratio = ratio
+                    best_term = term
+
+        return best_term
+
+    def _partition(self, first, length):
+        """(terms, {bigram: term indices}) of one partition, or None."""
+        return self.partitions.get((first, length))
+
+
+class ThreadCounters:
+    """Integer counters kept per thread, so counting never takes a lock; totals() sums all threads."""
+
+    def __init__(self, size):
+        self.size = size
+        self._local = threading.local()
+        self._all = []
+        self._lock = threading.Lock()
+
+    def local(self):
+        """The calling thread's counters (a list of `size` ints), incremented in place."""
+        try:
+            return self._local.counts
+        except AttributeError:
+            counts = self._local.counts = [0] * self.size
+            with self._lock:
+                self._all.append(counts)
+            return counts
+
+    def totals(self):
+        with self._lock:
+            return [sum(counts[i] for counts in self._all) for i in range(self.size)]
+
+    def reset(self):
+        with self._lock:
+            for counts in self._all:
+                counts[:] = [0] * self.size
+
+
+class FuzzyMemo:
+    """
+    Bounded memo from an unmatched word to its fuzzy result.
+
+    Negative results (no term above threshold) are cached too, so repeated
+    ordinary words cost one dict lookup after their first occurrence.
+    Safe to share between threads: lookups only read the dict and count
+    per thread, so the hit path takes no lock; put() locks and evicts the
+    oldest entry once the memo is full.
+    """
+    MISSING = object()
+
+    def __init__(self, max_size=100000):
+        self.max_size = max_size
+        self._entries = OrderedDict()
+        self._counts = ThreadCounters(2)  # hits, misses
+        self.evictions = 0
+        self._lock = threading.Lock()
+
+    def get(self, word):
+        """Return the cached result for `word`, or FuzzyMemo.MISSING."""
+        result = self._entries.get(word, self.MISSING)
+        self._counts.local()[result is self.MISSING] += 1
+        return result
+
+    def peek(self, word):
+        """Like get(), without touching the counters."""
+        return self._entries.get(word, self.MISSING)
+
+    def put(self, word, result):
+        if self.max_size <= 0:
+            return
+        with self._lock:
+            if word not in self._entries and len(self._entries) >= self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+            self._entries[word] = result
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._counts.reset()
+            self.evictions = 0
+
+    def stats(self):
+        hits, misses = self._counts.totals()
+        lookups = hits + misses
+        return {
+            "size": len(self._entries),
+            "max_size": self.max_size,
+            "hits": hits,
+            "misses": misses,
+            "evictions": self.evictions,
+            "hit_rate": round(hits / lookups, 4) if lookups else 0.0,
+        }
+
+    def __len__(self):
+        return len(self._entries)
+
+
+def _bigrams(s):
+    return [s[i:i + 2] for i in range(len(s) - 1)]
@@ -1,10 +1,15 @@
-import pandas as pd
 import os
+try:
+    from src.concepts import CONCEPTS
+except ImportError:
+    from concepts import CONCEPTS
 
 class KGBuilder:
     def __init__(self):
-        # Store unique normalized symptoms only
-        self.unique_symptoms = set()
+        # Store unique normalized symptoms only: interned concept codes (see concepts.py),
+        # plus symptom terms from the legacy format
+        self.symptom_codes = set()
+        self.symptom_terms = set()
         self.disorders = ["Depression", "Anxiety", "Stress"]
         
         # Hard-coded Mapping Rules (Symptom name -> Disorder)
@@ -26,13 +31,22 @@ class KGBuilder:
         for match in matches:
             # Handle both HPO IDs and text terms
             if 'id' in match:
-                symptom_id = match['id']
-                self.unique_symptoms.add(symptom_id)
+                self.symptom_codes.add(CONCEPTS.code(match['id']))
             elif 'term' in match:
                 # Fallback for legacy format
                 symptom_name = match['term'].lower().strip()
                 if symptom_name:
-                    self.unique_symptoms.add(symptom_name)
+                    self.symptom_terms.add(symptom_name)
+
+    def collect_codes(self, codes):
+        """Ingests concept codes (ints or an integer numpy array), e.g. the deduplicated codes of a MatchBatch."""
+        self.symptom_codes.update(int(code) for code in codes)
+
+    @property
+    def unique_symptoms(self):
+        """The collected symptoms as concept ID strings and terms, materialized for export and upload."""
+        ids = CONCEPTS.ids
+        return {ids[code] for code in self.symptom_codes} | self.symptom_terms
 
     def upload_to_neo4j(self, uri, username, password):
         """
@@ -61,9 +75,10 @@ class KGBuilder:
                 tx.run("MERGE (d:Disorder {name: $name})", name=d_name)
 
             # 2. Create Unique Symptom Nodes
-            if self.unique_symptoms:
-                print(f"Uploading {len(self.unique_symptoms)} unique concept nodes...")
-                batch_data = [{"name": s} for s in self.unique_symptoms]
+            unique_symptoms = self.unique_symptoms
+            if unique_symptoms:
+                print(f"Uploading {len(unique_symptoms)} unique concept nodes...")
+                batch_data = [{"name": s} for s in unique_symptoms]
                 
                 query_create_symptoms = """
                 UNWIND $batch AS row
@@ -107,13 +122,16 @@ class KGBuilder:
         """
         os.makedirs(output_dir, exist_ok=True)
         
+        import pandas as pd
+        
         print(f"Exporting local concept list to {output_dir}...")
-        df = pd.DataFrame(list(self.unique_symptoms), columns=["concept"])
+        unique_symptoms = self.unique_symptoms
+        df = pd.DataFrame(list(unique_symptoms), columns=["concept"])
         df.sort_values(by="concept", inplace=True)
         df.to_csv(f"{output_dir}/concepts.csv", index=False)
         
         with open(f"{output_dir}/kg_summary.txt", "w") as f:
-            f.write(f"Unique Concepts: {len(self.unique_symptoms)}\n")
+            f.write(f"Unique Concepts: {len(unique_symptoms)}\n")
             f.write(f"Note: Concepts may be HPO IDs (HP:XXXXXXX) or symptom terms\n")
 
 if __name__ == "__main__":
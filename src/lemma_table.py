@@ -0,0 +1,159 @@
+"""
+Precomputed lemma lookups with a lazy WordNet fallback.
+
+OntologyNER and the evaluation lemmatize word by word through NLTK's
+WordNetLemmatizer, which loads the WordNet corpus on first use and goes
+through the corpus reader on every call. LemmaTable answers from a frozen
+word -> lemma dict instead:
+
+  - lexicon lemmas are computed while the NER lexicon is built and stored
+    in the NER artifact;
+  - corpus vocabulary lemmas are built offline into a JSON table next to
+    the artifacts:
+
+    python src/lemma_table.py --input DATA/dreaddit-train.csv --annotations evaluation/ner_annotation_task.csv
+
+Only words missing from both go to WordNet, which is imported on the first
+such word. Without NLTK (or its data) those words are left unchanged.
+"""
+import argparse
+import json
+import os
+import re
+import sys
+import threading
+
+CORPUS_LEMMAS_PATH = "DATA/ner_artifacts/corpus_lemmas.json"
+
+
+class LemmaTable:
+    """
+    Word -> noun lemma table, a drop-in for WordNetLemmatizer.lemmatize().
+
+    Lookups that miss are resolved with WordNet and added to the table, so
+    each word goes through NLTK at most once per process. Table hits are
+    lock-free; misses are serialized, as NLTK's lazy WordNet loader is not
+    thread-safe.
+    """
+
+    def __init__(self, table=None):
+        self.table = dict(table) if table else {}
+        self.fallbacks = 0  # words resolved through WordNet since construction/load
+        self._wordnet = None
+        self._lock = threading.Lock()
+
+    def lemmatize(self, word, pos='n'):
+        if pos == 'n':
+            lemma = self.table.get(word)
+            if lemma is not None:
+                return lemma
+        with self._lock:
+            self.fallbacks += 1
+            lemma = self._fallback_lemmatize(word, pos)
+            if pos == 'n':
+                self.table[word] = lemma
+        return lemma
+
+    def lemmatize_phrase(self, text):
+        """Lemmatize each whitespace-separated word of `text`."""
+        return " ".join([self.lemmatize(w) for w in text.split()])
+
+    def update(self, words):
+        """Precompute lemmas for `words`."""
+        for word in words:
+            self.lemmatize(word)
+
+    def load(self, path):
+        """Merge a JSON table written by save()."""
+        with open(path, 'r', encoding='utf-8') as f:
+            for word, lemma in json.load(f).items():
+                self.table.setdefault(word, lemma)
+
+    def save(self, path):
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(self.table, f, ensure_ascii=False, sort_keys=True)
+
+    def _fallback_lemmatize(self, word, pos):
+        if self._wordnet is None:
+            try:
+                self._wordnet = _load_wordnet_lemmatizer()
+            except ImportError:
+                print("Warning: NLTK is not installed; words missing from the lemma table are left unchanged.")
+                self._wordnet = False
+        if self._wordnet is False:
+            return word
+        return self._wordnet.lemmatize(word, pos)
+
+    def __getstate__(self):
+        # The WordNet reader is not part of the table; it is recreated lazily
+        state = self.__dict__.copy()
+        state['_wordnet'] = None
+        state['fallbacks'] = 0
+        state.pop('_lock', None)
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+
+def _load_wordnet_lemmatizer():
+    """WordNetLemmatizer, downloading the WordNet data on first use if it is missing."""
+    import nltk
+    from nltk.stem import WordNetLemmatizer
+    try:
+        nltk.data.find('corpora/wordnet')
+    except LookupError:
+        nltk.download('wordnet', quiet=True)
+        nltk.download('omw-1.4', quiet=True)
+    return WordNetLemmatizer()
+
+
+def load_lemma_table(path=CORPUS_LEMMAS_PATH):
+    """A LemmaTable holding the corpus lemmas at `path`, if that file exists."""
+    table = LemmaTable()
+    if path and os.path.exists(path):
+        table.load(path)
+    return table
+
+
+def main():
+    import pandas as pd
+
+    parser = argparse.ArgumentParser(description="Build the corpus lemma table")
+    parser.add_argument("--input", type=str, default="DATA/dreaddit-train.csv", help="Corpus CSV")
+    parser.add_argument("--column", type=str, default="text", help="Text column of the corpus CSV")
+    parser.add_argument("--annotations", type=str, default="evaluation/ner_annotation_task.csv", help="Gold annotations CSV (optional)")
+    parser.add_argument("--output", type=str, default=CORPUS_LEMMAS_PATH, help="Output JSON table")
+    args = parser.parse_args()
+
+    texts = []
+    if os.path.exists(args.input):
+        texts.extend(str(t) for t in pd.read_csv(args.input)[args.column].fillna(''))
+    else:
+        print(f"Warning: {args.input} not found.")
+    if args.annotations and os.path.exists(args.annotations):
+        ann = pd.read_csv(args.annotations)
+        for col in ("text", "gold_symptoms", "gold"):
+            if col in ann.columns:
+                texts.extend(str(t) for t in ann[col].fillna(''))
+    if not texts:
+        print("No input texts; nothing to build.")
+        sys.exit(1)
+
+    # Lemmatization is applied to whitespace-split, lowercased spans, and to plain word tokens
+    words = set()
+    for text in texts:
+        lowered = text.lower()
+        words.update(lowered.split())
+        words.update(re.findall(r"\w+", lowered))
+
+    table = LemmaTable()
+    table.update(sorted(words))
+    table.save(args.output)
+    print(f"Saved {len(table.table)} corpus lemmas to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,135 @@
+"""
+Lexicon state shared by the OntologyNER engines of a process.
+
+A LexiconCore holds the term table, term list, Pass 1 matcher and baseline
+view built from one set of inputs (ontology cache file, social media
+lexicon, Pass 1 matcher, corpus lemmas, artifact directory) and is shared
+by every live engine built from them, baseline or improved. Each engine
+extracts with a core derived from it (LexiconCore.derive()); lexicon state
+is never modified in place. The ontology data and compiled Pass 2 scanners
+are shared the same way.
+"""
+import os
+import threading
+import weakref
+from collections.abc import Mapping
+
+try:
+    from src.ontology_loader import JSON_CACHE_PATH, load_hpo_ontology
+    from src.matchers import ContextPatternScanner
+except ImportError:
+    from ontology_loader import JSON_CACHE_PATH, load_hpo_ontology
+    from matchers import ContextPatternScanner
+
+ONTOLOGY_FIELDS = ("symptom_map", "hierarchy", "synonym_types", "metadata")
+
+_cores = weakref.WeakValueDictionary()
+_cores_lock = threading.Lock()
+_ontologies = {}
+_ontology_lock = threading.Lock()
+_scanners = weakref.WeakValueDictionary()
+_scanners_lock = threading.Lock()
+
+
+class LexiconCore:
+    """
+    Immutable lexicon state (OntologyNER.LEXICON_STATE) and the artifact it was loaded from or saved to.
+
+    Cores derived for an engine (see OntologyNER._derive_lexicon()) add the
+    engine's lexicon data, gate words and fuzzy memo.
+    """
+
+    def __init__(self, state, artifact_dir=None, artifact_key=None, artifact_path=None):
+        self.__dict__.update(state)
+        self.artifact_dir = artifact_dir
+        self.artifact_key = artifact_key
+        self.artifact_path = artifact_path
+
+    def derive(self, **changes):
+        """Copy of this core with the attributes in `changes` replaced; everything else is shared."""
+        core = object.__new__(LexiconCore)
+        core.__dict__.update(self.__dict__)
+        core.__dict__.update(changes)
+        return core
+
+
+class SubsetTermTable(Mapping):
+    """term -> concept code view of the table `terms` without the keys in `excluded`, with `overrides` applied."""
+
+    def __init__(self, terms, excluded, overrides):
+        self.terms = terms
+        self.excluded = excluded
+        self.overrides = overrides
+
+    def get(self, term, default=None):
+        s_id = self.overrides.get(term)
+        if s_id is not None:
+            return s_id
+        return default if term in self.excluded else self.terms.get(term, default)
+
+    def __getitem__(self, term):
+        s_id = self.get(term)
+        if s_id is None:
+            raise KeyError(term)
+        return s_id
+
+    def __contains__(self, term):
+        return term in self.terms and term not in self.excluded
+
+    def __len__(self):
+        return len(self.terms) - len(self.excluded)
+
+    def __iter__(self):
+        return (t for t in self.terms if t not in self.excluded)
+
+
+def ontology_stamp(path=JSON_CACHE_PATH):
+    """(mtime, size) of the processed ontology cache, or None if it does not exist yet."""
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return stat.st_mtime_ns, stat.st_size
+
+
+def get_lexicon_core(inputs, load, reload=False):
+    """
+    (core, shared): the live LexiconCore for `inputs`, or the one `load()` returns, which is then shared.
+
+    `inputs` is a hashable description of everything the state is built
+    from besides the ontology, including the artifact directory it is
+    loaded from and saved to (as an absolute path, so relative and absolute
+    spellings share). With reload=True, load() always runs and its core
+    replaces the shared one.
+    """
+    with _cores_lock:
+        core = None if reload else _cores.get((ontology_stamp(), inputs))
+        if core is not None:
+            return core, True
+        core = load()
+        # Building may have created the ontology cache, so the stamp is taken again
+        _cores[(ontology_stamp(), inputs)] = core
+        return core, False
+
+
+def shared_ontology():
+    """The processed ontology data (see ontology_loader.py), loaded at most once per version of its cache file."""
+    stamp = ontology_stamp()
+    with _ontology_lock:
+        data = _ontologies.get(stamp) if stamp is not None else None
+        if data is None:
+            loaded = load_hpo_ontology()
+            data = {name: loaded.get(name, {}) for name in ONTOLOGY_FIELDS}
+            _ontologies.clear()
+            _ontologies[ontology_stamp()] = data
+        return data
+
+
+def shared_pattern_scanner(patterns):
+    """ContextPatternScanner for `patterns` ((regex, concept ID) pairs), shared by the live engines using them."""
+    key = tuple(patterns)
+    with _scanners_lock:
+        scanner = _scanners.get(key)
+        if scanner is None:
+            scanner = _scanners[key] = ContextPatternScanner(key)
+        return scanner
@@ -0,0 +1,90 @@
+"""
+External data files for OntologyNER's hand-curated lexicon.
+
+The social media lexicon, the emoji map and the Pass 2 patterns are built
+into ner_engine.py. When the lexicon directory holds a JSON file for one of
+them, OntologyNER uses the file instead, so terms can be added without a
+code change:
+
+    manual_lexicon.json   {"term": "HP:...", ...}
+    emoji_map.json        {"<emoji>": "HP:...", ...}
+    pass2_patterns.json   [["<regex>", "HP:..."], ...]
+
+Write the built-in data out as a starting point with:
+
+    python src/lexicon_data.py --export
+
+A running engine picks up edited files with OntologyNER.reload_lexicon(),
+or takes individual terms through OntologyNER.update_lexicon().
+"""
+import argparse
+import json
+import os
+import sys
+
+LEXICON_DIR = "DATA/lexicon"
+MANUAL_LEXICON_FILE = "manual_lexicon.json"
+EMOJI_MAP_FILE = "emoji_map.json"
+PASS2_PATTERNS_FILE = "pass2_patterns.json"
+
+
+def lexicon_file_path(lexicon_dir, name):
+    """Path of data file `name` in `lexicon_dir`, or None if there is no such file (or no directory)."""
+    if lexicon_dir is None:
+        return None
+    path = os.path.join(lexicon_dir, name)
+    return path if os.path.exists(path) else None
+
+
+def load_lexicon_file(lexicon_dir, name, default):
+    """Contents of data file `name` in `lexicon_dir`, or default() if it does not exist."""
+    path = lexicon_file_path(lexicon_dir, name)
+    if path is None:
+        return default()
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def save_lexicon_file(lexicon_dir, name, data):
+    """Write `data` to data file `name` in `lexicon_dir` atomically; returns the path."""
+    os.makedirs(lexicon_dir, exist_ok=True)
+    path = os.path.join(lexicon_dir, name)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False, indent=2)
+        f.write("\n")
+    os.replace(tmp_path, path)
+    return path
+
+
+def main():
+    sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+    try:
+        from src.ner_engine import OntologyNER
+    except ImportError:
+        from ner_engine import OntologyNER
+
+    parser = argparse.ArgumentParser(description="Export the built-in NER lexicon data to editable JSON files")
+    parser.add_argument("--export", action="store_true", help="Write the built-in lexicon, emoji map and patterns")
+    parser.add_argument("--lexicon-dir", type=str, default=LEXICON_DIR, help="Lexicon data directory")
+    parser.add_argument("--force", action="store_true", help="Overwrite existing data files")
+    args = parser.parse_args()
+
+    if not args.export:
+        parser.print_help()
+        return
+    data = {
+        MANUAL_LEXICON_FILE: OntologyNER._default_manual_lexicon(),
+        EMOJI_MAP_FILE: OntologyNER._default_emoji_mappings(),
+        PASS2_PATTERNS_FILE: [list(p) for p in OntologyNER._default_pass2_patterns()],
+    }
+    for name, contents in data.items():
+        if lexicon_file_path(args.lexicon_dir, name) and not args.force:
+            print(f"Keeping existing {os.path.join(args.lexicon_dir, name)} (use --force to overwrite)")
+            continue
+        path = save_lexicon_file(args.lexicon_dir, name, contents)
+        print(f"Saved {len(contents)} entries to {path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,750 @@
+import copy
+import re
+from bisect import bisect_left
+from itertools import accumulate
+from typing import Dict, List, Tuple
+
+# The case-stability checks and the Pass 2 prefix/anchor analysis read CPython's private regex
+# internals (parse trees, re.IGNORECASE case tables); where they are missing, every pattern is
+# compiled with re.IGNORECASE and Pass 2 scans without prefix dispatch or anchor prefilter
+try:
+    import _sre as _sre_engine
+    from re import _parser as _sre_parse, _constants as _sre
+    from re._casefix import _EXTRA_CASES as _IGNORECASE_EXTRA
+except ImportError:
+    try:  # Python < 3.11
+        import _sre as _sre_engine
+        import sre_parse as _sre_parse
+        import sre_constants as _sre
+        from sre_compile import _ignorecase_fixes as _IGNORECASE_EXTRA
+    except ImportError:
+        _sre_engine = _sre_parse = _sre = _IGNORECASE_EXTRA = None
+
+WORD_RE = re.compile(r'\w+')
+# Splitting on a captured WORD_RE alternates separators and tokens: [sep, tok, sep, ..., tok, sep]
+_TOKEN_SPLIT_RE = re.compile(r'(\w+)')
+
+# Characters that `re.IGNORECASE` treats as equal to an ASCII/Greek letter but
+# which str.lower() leaves alone (or expands, in the case of U+0130). Mapping
+# them first keeps the case-folded text the same length as the original.
+_PRE_LOWER_FOLD = str.maketrans({'İ': 'i'})
+_POST_LOWER_FOLD = str.maketrans({
+    'ı': 'i',  # dotless i
+    'ſ': 's',  # long s
+    'K': 'k',  # Kelvin sign
+    'µ': 'μ',
+    'ς': 'σ',  # final sigma
+    'ϐ': 'β',
+    'ϑ': 'θ',
+    'ϕ': 'φ',
+    'ϖ': 'π',
+    'ϰ': 'κ',
+    'ϱ': 'ρ',
+    'ϵ': 'ε',
+    'ẛ': 'ṡ',
+})
+
+
+# str.translate is slow on long non-ASCII text, so only run it when a mapped character is present
+_FOLD_CHARS_RE = re.compile('[' + ''.join(chr(c) for c in list(_PRE_LOWER_FOLD) + list(_POST_LOWER_FOLD)) + ']')
+
+
+def has_fold_mappings(text):
+    """True if fold_case(text) differs from text.lower()."""
+    return not text.isascii() and _FOLD_CHARS_RE.search(text) is not None
+
+
+def fold_case(text):
+    """Lowercase `text` the way re.IGNORECASE compares it, keeping offsets stable."""
+    if not has_fold_mappings(text):
+        return text.lower()
+    return text.translate(_PRE_LOWER_FOLD).lower().translate(_POST_LOWER_FOLD)
+
+
+def is_case_stable(chars):
+    """
+    True if each character in `chars`, as a literal, matches fold_case(text)
+    case-sensitively exactly where it matches `text` under re.IGNORECASE.
+
+    That holds when the character is its own fold and so are the extra
+    characters re.IGNORECASE equates with its lowercase (e.g. 'k' and the
+    Kelvin sign). Sigma is excluded: its lowercase depends on context.
+    Always False without the regex internals.
+    """
+    if _sre is None:
+        return False
+    for c in set(chars):
+        if c in 'σς' or fold_case(c) != c:
+            return False
+        if any(fold_case(chr(e)) != c for e in _IGNORECASE_EXTRA.get(_sre_engine.unicode_tolower(ord(c)), ())):
+            return False
+    return True
+
+
+def is_pattern_case_stable(pattern):
+    """True if `pattern` can run case-sensitively on fold_case(text) instead of with re.IGNORECASE on text."""
+    if _sre is None:
+        return False
+    parsed = _sre_parse.parse(pattern)
+    return not parsed.state.flags & _sre.SRE_FLAG_IGNORECASE and _items_case_stable(parsed)
+
+
+def _items_case_stable(items):
+    for op, av in items:
+        if op in (_sre.LITERAL, _sre.NOT_LITERAL):
+            stable = is_case_stable(chr(av))
+        elif op is _sre.IN:
+            stable = all(_class_item_case_stable(item_op, item_av) for item_op, item_av in av)
+        elif op is _sre.SUBPATTERN:
+            _, add_flags, del_flags, sub = av
+            stable = not (add_flags or del_flags) and _items_case_stable(sub)
+        elif op is _sre.BRANCH:
+            stable = all(_items_case_stable(branch) for branch in av[1])
+        elif op in _REPEAT_OPS:
+            stable = _items_case_stable(av[-1])
+        elif op in (_sre.ASSERT, _sre.ASSERT_NOT):
+            stable = _items_case_stable(av[1])
+        else:
+            # Backreferences and conditionals compare case-insensitively; keep them on IGNORECASE
+            stable = op in (_sre.AT, _sre.ANY, _sre.CATEGORY)
+        if not stable:
+            return False
+    return True
+
+
+_REPEAT_OPS = {_sre.MAX_REPEAT, _sre.MIN_REPEAT, getattr(_sre, 'POSSESSIVE_REPEAT', _sre.MAX_REPEAT)} if _sre else set()
+
+
+def _class_item_case_stable(op, av):
+    if op is _sre.LITERAL:
+        return is_case_stable(chr(av))
+    if op is _sre.RANGE:
+        low, high = av
+        return high - low < 256 and is_case_stable(map(chr, range(low, high + 1)))
+    return op in (_sre.NEGATE, _sre.CATEGORY)
+
+
+def compile_folded(pattern, case_fold=True):
+    """
+    Compile `pattern` to run case-sensitively on fold_case(text) when it is
+    case-stable (and `case_fold` is set), otherwise with re.IGNORECASE on
+    the original text. Use match_target() to pick the text to run it on.
+    """
+    if case_fold and is_pattern_case_stable(pattern):
+        return re.compile(pattern)
+    return re.compile(pattern, re.IGNORECASE)
+
+
+def match_target(regex, text, folded):
+    """The string `regex` (from compile_folded() or compile_term_regex()) runs on."""
+    return text if regex.flags & re.IGNORECASE else folded
+
+
+class TokenStream:
+    """
+    A post tokenized once, shared by every pass of one extraction.
+
+    `folded` is fold_case(text), with the same offsets as `text`; `words`,
+    `starts` and `ends` are its \w+ tokens. Case folding never changes
+    whether a character is a word character, so these are the tokens of
+    `text` as well. `plain` is True when every slice of `folded` equals
+    str.lower() of the same slice of `text` (no fold mappings and no
+    capital sigma, whose lowercase depends on the next character), so
+    token and span strings can be taken from `folded` directly. Built
+    with one split in C.
+    """
+    __slots__ = ("text", "folded", "plain", "words", "starts", "ends", "_word_set")
+
+    def __init__(self, text):
+        self.text = text
+        mapped = has_fold_mappings(text)
+        self.plain = not mapped and '\u03a3' not in text
+        self.folded = folded = fold_case(text) if mapped else text.lower()
+        parts = _TOKEN_SPLIT_RE.split(folded)
+        offsets = list(accumulate(map(len, parts)))
+        self.words = parts[1::2]
+        self.starts = offsets[0:-1:2]
+        self.ends = offsets[1::2]
+        self._word_set = None
+
+    @property
+    def word_set(self):
+        if self._word_set is None:
+            self._word_set = set(self.words)
+        return self._word_set
+
+    def between(self, start, end):
+        """Index range of the tokens starting in [start, end)."""
+        starts = self.starts
+        lo = bisect_left(starts, start)
+        return lo, bisect_left(starts, end, lo)
+
+    def __len__(self):
+        return len(self.words)
+
+
+class RegexTermMatcher:
+    """Original Pass 1 matcher: one alternation over every term, longest first."""
+    name = "regex"
+
+    def __init__(self, terms, case_fold=True):
+        self.case_fold = case_fold
+        self.regex = compile_term_regex(terms, case_fold)
+
+    def patched(self, terms, added=(), removed=()):
+        """Matcher over the new term list `terms`; the alternation is a single regex, so it is recompiled."""
+        return RegexTermMatcher(terms, self.case_fold)
+
+    def subset(self, terms, excluded):
+        """Matcher over `terms`, its terms without `excluded`; recompiled, as in patched()."""
+        return RegexTermMatcher(terms, self.case_fold)
+
+    def finditer(self, text, tokens=None):
+        """Yield (start, end) spans of dictionary matches in `text`."""
+        if self.regex is None:
+            return
+        if self.regex.flags & re.IGNORECASE:
+            target = text
+        else:
+            target = tokens.folded if tokens is not None else fold_case(text)
+        for m in self.regex.finditer(target):
+            yield m.start(), m.end()
+
+
+class TokenTermMatcher:
+    """
+    Pass 1 matcher over word tokens instead of a giant regex alternation.
+
+    Every term that starts and ends with a word character can only match at a
+    token start and end at a token end (or one character before it, for the
+    plural 's'). So instead of an automaton we look up the candidate spans
+    that start at each token directly in a hash set, longest span first.
+    Terms are indexed by their first token together with the token counts
+    that occur for it, so each text token costs a handful of dict lookups.
+
+    The few terms that start or end with punctuation are delegated to a small
+    regex so the result is identical to RegexTermMatcher.
+    """
+    name = "token"
+
+    def __init__(self, terms, case_fold=True):
+        self.case_fold = case_fold
+        self.terms = set()
+        # first token -> token counts (descending) of the terms starting with it
+        self.first_token_lengths: Dict[str, Tuple[int, ...]] = {}
+        irregular = []
+
+        lengths = {}
+        for term in terms:
+            if not term:
+                continue
+            if not _is_regular_term(term):
+                irregular.append(term)
+                continue
+            tokens = WORD_RE.findall(term)
+            self.terms.add(term)
+            lengths.setdefault(tokens[0], set()).add(len(tokens))
+        self.first_token_lengths = {
+            tok: tuple(sorted(counts, reverse=True)) for tok, counts in lengths.items()
+        }
+        self.irregular = irregular
+        self._compile_irregular()
+
+    def _compile_irregular(self):
+        self.irregular_regex = compile_term_regex(self.irregular, self.case_fold)
+        # Irregular terms starting with punctuation can begin outside a token
+        lead_chars = {t[0] for t in self.irregular if not _is_word_char(t[0])}
+        self.irregular_lead_regex = (
+            compile_folded('[' + ''.join(re.escape(c) for c in sorted(lead_chars)) + ']', self.case_fold)
+            if lead_chars else None
+        )
+
+    def patched(self, terms, added=(), removed=()):
+        """
+        Copy of this matcher over `terms`, which differ from its terms by `added` and `removed`.
+
+        The term set is copied and patched and only the first-token entries
+        of `added` are updated; the token count of a removed term may stay
+        indexed, which only costs a lookup that misses. The irregular-term
+        regex is recompiled only when an irregular term changed.
+        """
+        matcher = copy.copy(self)
+        removed = set(removed)
+        matcher.terms = set(self.terms)
+        matcher.terms.difference_update(removed)
+        lengths = dict(self.first_token_lengths)
+        irregular_changed = any(t and not _is_regular_term(t) for t in removed)
+        for term in added:
+            if not term:
+                continue
+            if not _is_regular_term(term):
+                irregular_changed = True
+                continue
+            tokens = WORD_RE.findall(term)
+            matcher.terms.add(term)
+            lengths[tokens[0]] = tuple(sorted(set(lengths.get(tokens[0], ())) | {len(tokens)}, reverse=True))
+        matcher.first_token_lengths = lengths
+        if irregular_changed:
+            matcher.irregular = [t for t in self.irregular if t not in removed]
+            matcher.irregular += [t for t in added if t and not _is_regular_term(t)]
+            matcher._compile_irregular()
+        return matcher
+
+    def subset(self, terms, excluded):
+        """
+        Copy of this matcher over `terms`, its terms without the set `excluded`.
+
+        The term set becomes a view that hides `excluded` instead of a copy;
+        the first-token index is kept, so an excluded term's token count only
+        costs a lookup that misses.
+        """
+        matcher = copy.copy(self)
+        matcher.terms = TermSubset(self.terms, excluded)
+        if any(t in excluded for t in self.irregular):
+            matcher.irregular = [t for t in self.irregular if t not in excluded]
+            matcher._compile_irregular()
+        return matcher
+
+    def finditer(self, text, tokens=None):
+        """Yield (start, end) spans of dictionary matches in `text` (tokenized as `tokens`, if given)."""
+        if tokens is None:
+            tokens = TokenStream(text)
+        folded, words, tok_ends = tokens.folded, tokens.words, tokens.ends
+        n_tokens = len(words)
+        starts = zip(tokens.starts, range(n_tokens))
+        if self.irregular_lead_regex is not None:
+            lead_regex = self.irregular_lead_regex
+            extra = [(m.start(), -1) for m in lead_regex.finditer(match_target(lead_regex, text, folded))]
+            if extra:
+                starts = sorted(list(starts) + extra)
+
+        terms = self.terms
+        lengths_for = self.first_token_lengths
+        irregular_regex = self.irregular_regex
+        irregular_target = match_target(irregular_regex, text, folded) if irregular_regex is not None else None
+        pos = 0
+        for start, i in starts:
+            if start < pos:
+                continue
+            best_end = -1
+            if i >= 0:
+                tok = words[i]
+                for n in lengths_for.get(tok, ()):
+                    j = i + n - 1
+                    if j >= n_tokens:
+                        continue
+                    end = tok_ends[j]
+                    cand = folded[start:end]
+                    if cand in terms or (cand[-1] == 's' and cand[:-1] in terms):
+                        best_end = end
+                        break
+                # Single-token plural whose singular is a term ("pains" -> "pain")
+                if best_end < 0 and tok[-1] == 's' and tok[:-1] in terms:
+                    best_end = tok_ends[i]
+            if irregular_regex is not None:
+                m = irregular_regex.match(irregular_target, start)
+                if m and m.end() > best_end:
+                    best_end = m.end()
+            if best_end > start:
+                yield start, best_end
+                pos = best_end
+
+
+class TermSubset:
+    """Membership view of the term set `terms` without the set `excluded`."""
+
+    def __init__(self, terms, excluded):
+        self.terms = terms
+        self.excluded = excluded
+
+    def __contains__(self, term):
+        return term in self.terms and term not in self.excluded
+
+    def __len__(self):
+        return sum(1 for _ in self)
+
+    def __iter__(self):
+        return (t for t in self.terms if t not in self.excluded)
+
+
+class ContextPatternScanner:
+    """
+    Pass 2 contextual patterns compiled once into a single multi-pattern scan.
+
+    Every pattern is analysed at init for the literal prefixes its matches
+    must start with (e.g. "feel", "am", "be" for the "feeling low" pattern).
+    A scan walks the post's tokens once and, at each token start, looks the
+    next few case-folded characters up in a prefix -> pattern index table,
+    running only the patterns that can start there (anchored, in C). The
+    per-pattern non-overlap rule of finditer is replayed, so the output is
+    identical to running each pattern's finditer in turn. Patterns without
+    a usable literal prefix fall back to their own finditer.
+
+    Each pattern also gets a set of anchor tokens, at least one of which is a
+    whole token of every possible match ("bed", "sleep", "doom", ...). Before
+    scanning, the post's token set is computed once and patterns whose
+    anchors are all absent are skipped; most posts skip nearly all of them.
+    """
+    PREFIX_LENGTH = 4
+    # With this few active patterns, their own finditer (in C) beats the token walk
+    DIRECT_SCAN_MAX = 4
+
+    def __init__(self, patterns, case_fold=True):
+        self.patterns = list(patterns)
+        # Case-stable patterns run case-sensitively on the folded post (see compile_folded)
+        self.compiled = [compile_folded(p, case_fold) for p, _ in self.patterns]
+        self.on_folded = [not regex.flags & re.IGNORECASE for regex in self.compiled]
+        self.concept_ids = [s_id for _, s_id in self.patterns]
+
+        # folded literal prefix -> pattern indices that may start with it
+        self.prefix_table: Dict[str, List[int]] = {}
+        self.unanchored: List[int] = []
+        for i, (pattern, _) in enumerate(self.patterns):
+            prefixes = literal_prefixes(pattern, self.PREFIX_LENGTH)
+            if prefixes is None:
+                self.unanchored.append(i)
+                continue
+            for prefix in prefixes:
+                self.prefix_table.setdefault(prefix, []).append(i)
+        self.prefix_lengths = sorted({len(p) for p in self.prefix_table})
+
+        # anchor token -> pattern indices; patterns without anchors always run
+        self.anchors = [required_anchor_tokens(p) for p, _ in self.patterns]
+        self.anchor_index: Dict[str, List[int]] = {}
+        self.always_active = []
+        for i, anchors in enumerate(self.anchors):
+            if anchors is None:
+                self.always_active.append(i)
+                continue
+            for anchor in anchors:
+                self.anchor_index.setdefault(anchor, []).append(i)
+
+    def active_patterns(self, tokens):
+        """Indices of the patterns whose anchors occur in the folded token set."""
+        active = set(self.always_active)
+        for anchor in self.anchor_index.keys() & tokens:
+            active.update(self.anchor_index[anchor])
+        return active
+
+    def scan(self, text, prefilter=True, tokens=None):
+        """Return (pattern index, start, end) triples in pattern order, then position."""
+        compiled = self.compiled
+        n = len(compiled)
+        spans = [[] for _ in range(n)]
+        next_pos = [0] * n
+
+        if tokens is None:
+            tokens = TokenStream(text)
+        folded = tokens.folded
+        targets = [folded if on_folded else text for on_folded in self.on_folded]
+        if prefilter:
+            active = self.active_patterns(tokens.word_set)
+            if len(active) <= self.DIRECT_SCAN_MAX:
+                return [(i, m.start(), m.end()) for i in sorted(active) for m in compiled[i].finditer(targets[i])]
+        else:
+            active = range(n)
+
+        if self.prefix_table:
+            table = self.prefix_table
+            lengths = self.prefix_lengths
+            for pos in tokens.starts:
+                candidates = None
+                for l in lengths:
+                    hit = table.get(folded[pos:pos + l])
+                    if hit:
+                        candidates = hit if candidates is None else sorted(set(candidates).union(hit))
+                if candidates is None:
+                    continue
+                for i in candidates:
+                    if pos < next_pos[i] or i not in active:
+                        continue
+                    m = compiled[i].match(targets[i], pos)
+                    if m is None:
+                        continue
+                    start, end = m.span()
+                    spans[i].append((start, end))
+                    next_pos[i] = end if end > start else end + 1
+
+        for i in self.unanchored:
+            if i in active:
+                spans[i] = [m.span() for m in compiled[i].finditer(targets[i])]
+
+        return [(i, start, end) for i in range(n) for start, end in spans[i]]
+
+    def __len__(self):
+        return len(self.patterns)
+
+
+class EmojiMatcher:
+    """
+    Pass 0 emoji lookup in a single scan, independent of the table size.
+
+    The original loop called text.find() once per table entry. Here ASCII
+    posts are skipped outright; other posts are scanned once (in C) for the
+    first characters of all entries, and only the entries starting with a
+    hit character are compared there. Multi-codepoint sequences such as
+    "\u2639\ufe0f" work the same as single characters. Results keep the
+    original order (table order, then position) and each entry's own
+    non-overlapping find() semantics.
+    """
+
+    def __init__(self, mapping):
+        self.entries = [e for e in mapping if e]
+        # first character -> indices of the entries starting with it
+        self.by_first_char: Dict[str, List[int]] = {}
+        for i, emoji in enumerate(self.entries):
+            self.by_first_char.setdefault(emoji[0], []).append(i)
+        self.first_char_regex = re.compile(_char_class(self.by_first_char)) if self.by_first_char else None
+        # Entries with a non-ASCII character can never occur in an ASCII post
+        self.has_ascii_entries = any(emoji.isascii() for emoji in self.entries)
+
+    def finditer(self, text):
+        """Return (emoji, start, end) triples in table order, then position."""
+        if self.first_char_regex is None or (not self.has_ascii_entries and text.isascii()):
+            return []
+        entries = self.entries
+        hits = {}
+        next_pos = {}
+        for m in self.first_char_regex.finditer(text):
+            pos = m.start()
+            for i in self.by_first_char[m.group()]:
+                emoji = entries[i]
+                if pos >= next_pos.get(i, 0) and text.startswith(emoji, pos):
+                    hits.setdefault(i, []).append(pos)
+                    next_pos[i] = pos + len(emoji)
+        return [(entries[i], pos, pos + len(entries[i])) for i in sorted(hits) for pos in hits[i]]
+
+
+def literal_prefixes(pattern, max_len):
+    """
+    Return the set of case-folded strings (up to `max_len` chars) that every
+    match of `pattern` starts with, or None if the pattern does not begin
+    with a word boundary followed by a finite set of word-character literals.
+    """
+    if _sre is None:
+        return None
+    parsed = list(_sre_parse.parse(pattern))
+    if not parsed or parsed[0] != (_sre.AT, _sre.AT_BOUNDARY):
+        return None
+    paths = _sequence_prefixes(parsed[1:], max_len)
+    if paths is None:
+        return None
+    prefixes = {s for s, _ in paths}
+    if any(not s or not _is_word_char(s[0]) for s in prefixes):
+        return None
+    return prefixes
+
+
+def required_anchor_tokens(pattern):
+    """
+    Return a set of case-folded tokens such that every match of `pattern`
+    contains at least one of them as a whole token, or None if no such set
+    can be derived (e.g. a path made only of character classes).
+    """
+    if _sre is None:
+        return None
+    paths = _expand_paths(list(_sre_parse.parse(pattern)))
+    if paths is None:
+        return None
+
+    path_tokens = []
+    for path in paths:
+        tokens = _complete_tokens(path)
+        if not tokens:
+            return None
+        path_tokens.append(tokens)
+
+    # Greedy weighted set cover over paths: prefer few, uncommon anchor tokens
+    anchors = set()
+    uncovered = list(range(len(path_tokens)))
+    while uncovered:
+        coverage = {}
+        for idx in uncovered:
+            for tok in set(path_tokens[idx]):
+                coverage[tok] = coverage.get(tok, 0) + 1
+        best = max(coverage, key=lambda t: (coverage[t] / _anchor_weight(t), len(t), t))
+        anchors.add(best)
+        uncovered = [idx for idx in uncovered if best not in path_tokens[idx]]
+    return frozenset(anchors)
+
+
+# Very frequent tokens make poor anchors; they are only chosen when unavoidable
+_COMMON_TOKENS = frozenset("""
+a about after all am an and any are as at away be been but by can could did do does don for from get go going
+had has have i if in is it just like me my myself no not of off on or out over really so t that the this to up
+very was were will with would you
+""".split())
+
+
+def _anchor_weight(token):
+    return 25 if token in _COMMON_TOKENS or len(token) <= 2 else 1
+
+
+# Placeholders used while expanding a pattern into representative strings
+_BOUNDARY = '\x01'   # zero-width \b
+_UNKNOWN = '\x00'    # anything we cannot spell out (classes, unbounded repeats)
+_MAX_EXPANDED_PATHS = 4096
+
+
+def _expand_paths(items):
+    paths = {''}
+    for op, av in items:
+        options = _expand_item(op, av)
+        if options is None:
+            return None
+        paths = {p + o for p in paths for o in options}
+        if len(paths) > _MAX_EXPANDED_PATHS:
+            return None
+    return paths
+
+
+def _expand_item(op, av):
+    if op is _sre.LITERAL:
+        return {fold_case(chr(av))}
+    if op is _sre.AT:
+        return {_BOUNDARY if av is _sre.AT_BOUNDARY else _UNKNOWN}
+    if op is _sre.SUBPATTERN:
+        return _expand_paths(list(av[-1]))
+    if op is _sre.BRANCH:
+        options = set()
+        for branch in av[1]:
+            branch_paths = _expand_paths(list(branch))
+            if branch_paths is None:
+                return None
+            options |= branch_paths
+        return options
+    if op in (_sre.MAX_REPEAT, _sre.MIN_REPEAT):
+        low, high, item = av
+        item = list(item)
+        if low == 0 and high == 1:
+            inner = _expand_paths(item)
+            return None if inner is None else inner | {''}
+        if low >= 1 and item == [(_sre.IN, [(_sre.CATEGORY, _sre.CATEGORY_SPACE)])]:
+            return {' '}  # \s+ is at least one whitespace (non-word) character
+    return {_UNKNOWN}
+
+
+def _complete_tokens(path):
+    """Word runs in `path` that are delimited by known non-word characters."""
+    tokens = []
+    for m in WORD_RE.finditer(path):
+        start, end = m.span()
+        before = path[start - 1] if start > 0 else None
+        after = path[end] if end < len(path) else None
+        if before in (None, _UNKNOWN) or after in (None, _UNKNOWN):
+            continue
+        tokens.append(m.group())
+    return tokens
+
+
+_MAX_PREFIX_PATHS = 256
+
+
+def _sequence_prefixes(items, max_len):
+    # Each path is (literal prefix so far, whether it can still be extended)
+    paths = {('', True)}
+    for op, av in items:
+        extended = set()
+        for prefix, is_open in paths:
+            if not is_open or len(prefix) >= max_len:
+                extended.add((prefix[:max_len], False))
+                continue
+            item_paths = _item_prefixes(op, av, max_len - len(prefix))
+            if item_paths is None:
+                return None
+            for suffix, suffix_open in item_paths:
+                extended.add((prefix + suffix, suffix_open))
+        if len(extended) > _MAX_PREFIX_PATHS:
+            return None
+        paths = extended
+    return {(prefix[:max_len], is_open) for prefix, is_open in paths}
+
+
+def _item_prefixes(op, av, max_len):
+    if op is _sre.LITERAL:
+        return {(fold_case(chr(av)), True)}
+    if op is _sre.AT:
+        return {('', True)}
+    if op is _sre.SUBPATTERN:
+        return _sequence_prefixes(av[-1], max_len)
+    if op is _sre.BRANCH:
+        paths = set()
+        for branch in av[1]:
+            branch_paths = _sequence_prefixes(branch, max_len)
+            if branch_paths is None:
+                return None
+            paths |= branch_paths
+        return paths
+    if op in (_sre.MAX_REPEAT, _sre.MIN_REPEAT):
+        low, high, item = av
+        if low == 0 and high == 1:
+            inner = _sequence_prefixes(item, max_len)
+            return None if inner is None else inner | {('', True)}
+        if low >= 1:
+            inner = _sequence_prefixes(item, max_len)
+            return None if inner is None else {(s, False) for s, _ in inner}
+    # Anything else (classes, categories, unbounded repeats) ends the literal prefix
+    return {('', False)}
+
+
+PASS1_MATCHERS = {
+    RegexTermMatcher.name: RegexTermMatcher,
+    TokenTermMatcher.name: TokenTermMatcher,
+}
+
+
+def build_pass1_matcher(name, terms):
+    """Instantiate the Pass 1 matcher registered under `name`."""
+    if name not in PASS1_MATCHERS:
+        raise ValueError(f"Unknown Pass 1 matcher '{name}'. Available: {sorted(PASS1_MATCHERS)}")
+    return PASS1_MATCHERS[name](terms)
+
+
+def compile_term_regex(terms, case_fold=True):
+    """
+    Compile the longest-first term alternation used by the original Pass 1.
+
+    With `case_fold`, case-stable terms are folded and compiled
+    case-sensitively, to run on fold_case(text) (see match_target()).
+    """
+    flags = re.IGNORECASE
+    if case_fold:
+        folded_terms = [fold_case(t) for t in terms]
+        if is_case_stable(''.join(folded_terms)):
+            terms, flags = folded_terms, 0
+    escaped_terms = [re.escape(t) for t in sorted(terms, key=len, reverse=True)]
+    if not escaped_terms: return None
+    pattern_str = r'\b(?:' + '|'.join(escaped_terms) + r')(?:\b|s\b)'  # Allow plural forms
+    try:
+        return re.compile(pattern_str, flags)
+    except Exception as e:
+        print(f"Warning: Regex compilation failed ({e}).")
+        return None
+
+
+def _char_class(chars):
+    """Regex character class for `chars`, with consecutive codepoints collapsed into ranges.
+
+    sre tests astral characters in a class one literal at a time, so ranges
+    keep the per-character cost flat for emoji blocks.
+    """
+    codepoints = sorted(ord(c) for c in chars)
+    parts = []
+    start = prev = codepoints[0]
+    for cp in codepoints[1:] + [None]:
+        if cp is not None and cp == prev + 1:
+            prev = cp
+            continue
+        parts.append(re.escape(chr(start)) if start == prev else f"{re.escape(chr(start))}-{re.escape(chr(prev))}")
+        if cp is not None:
+            start = prev = cp
+    return '[' + ''.join(parts) + ']'
+
+
+def _is_regular_term(term):
+    """True if `term` starts and ends with a word character (see TokenTermMatcher)."""
+    return _is_word_char(term[0]) and _is_word_char(term[-1])
+
+
+def _is_word_char(c):
+    return c.isalnum() or c == '_'
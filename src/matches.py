@@ -0,0 +1,163 @@
+from array import array
+from collections.abc import Mapping
+
+try:
+    from src.concepts import CONCEPTS
+except ImportError:
+    from concepts import CONCEPTS
+
+MATCH_TYPES = ("emoji", "exact", "fuzzy", "pattern")
+TEMPORAL_LABELS = ("past", "present", "future")
+INTENSITY_LABELS = ("high", "medium", "low")
+
+
+class Match(Mapping):
+    """
+    One extracted mention.
+
+    Stores offsets into the post instead of copied substrings; `text` and
+    `term` are sliced from the post on access. Behaves as a read-only dict
+    with the same keys as before ('text', 'term', 'id', 'start', 'end',
+    'match_type', 'confidence', 'negated' and, in improved mode, 'temporal'
+    and 'intensity'), so match['id'], match.get('negated') and dict(match)
+    keep working. Use to_dict() where a real dict is needed (e.g. JSON).
+
+    The concept is held as its interned code (see concepts.py); `id` looks
+    the ID string up on access.
+    """
+    __slots__ = ("source", "start", "end", "code", "match_type", "confidence", "negated", "temporal", "intensity")
+
+    _BASE_KEYS = ("text", "term", "id", "start", "end", "match_type", "confidence", "negated")
+    _CONTEXT_KEYS = ("temporal", "intensity")
+
+    def __init__(self, source, start, end, code, match_type, confidence,
+                 negated=False, temporal=None, intensity=None):
+        self.source = source
+        self.start = start
+        self.end = end
+        self.code = code
+        self.match_type = match_type
+        self.confidence = confidence
+        self.negated = negated
+        # None means the field is absent (baseline mode does not annotate context)
+        self.temporal = temporal
+        self.intensity = intensity
+
+    @property
+    def id(self):
+        return CONCEPTS.ids[self.code]
+
+    @property
+    def text(self):
+        return self.source[self.start:self.end]
+
+    @property
+    def term(self):
+        return self.text.lower()
+
+    def _keys(self):
+        if self.temporal is None and self.intensity is None:
+            return self._BASE_KEYS
+        return self._BASE_KEYS + tuple(k for k in self._CONTEXT_KEYS if getattr(self, k) is not None)
+
+    def __getitem__(self, key):
+        if key in self._BASE_KEYS or (key in self._CONTEXT_KEYS and getattr(self, key) is not None):
+            return getattr(self, key)
+        raise KeyError(key)
+
+    def __iter__(self):
+        return iter(self._keys())
+
+    def __len__(self):
+        return len(self._keys())
+
+    def to_dict(self):
+        return {key: getattr(self, key) for key in self._keys()}
+
+    def __repr__(self):
+        return f"Match({self.to_dict()!r})"
+
+
+class MatchBatch:
+    """
+    Columnar extraction result for many posts.
+
+    Parallel arrays hold offsets, interned concept codes, confidences and
+    flags; post i owns rows post_offsets[i]:post_offsets[i + 1]. Concept
+    codes are those of the process-wide registry (concepts.CONCEPTS), so
+    batches can be combined and aggregated without touching ID strings.
+    Substrings are only created when a post's matches are viewed as Match
+    objects.
+    """
+
+    def __init__(self):
+        self.texts = []
+        self.post_offsets = array('q', [0])
+        self.starts = array('q')
+        self.ends = array('q')
+        self.concept_codes = array('i')
+        self.confidences = array('d')
+        self.match_types = array('b')
+        self.negated = array('b')
+        self.temporal = array('b')  # index into TEMPORAL_LABELS, -1 when absent
+        self.intensity = array('b')  # index into INTENSITY_LABELS, -1 when absent
+
+    @classmethod
+    def from_results(cls, texts, results):
+        """Build a batch from posts and their per-post lists of matches."""
+        batch = cls()
+        for text, matches in zip(texts, results):
+            batch.append(text, matches)
+        return batch
+
+    def append(self, text, matches):
+        """Add one post and its matches (Match objects or match dicts)."""
+        for m in matches:
+            if isinstance(m, Match):
+                start, end, code, confidence = m.start, m.end, m.code, m.confidence
+                match_type, negated, temporal, intensity = m.match_type, m.negated, m.temporal, m.intensity
+            else:
+                start, end, code, confidence = m['start'], m['end'], CONCEPTS.code(m['id']), m['confidence']
+                match_type, negated, temporal, intensity = m['match_type'], m['negated'], m.get('temporal'), m.get('intensity')
+            self.starts.append(start)
+            self.ends.append(end)
+            self.concept_codes.append(code)
+            self.confidences.append(confidence)
+            self.match_types.append(MATCH_TYPES.index(match_type))
+            self.negated.append(bool(negated))
+            self.temporal.append(TEMPORAL_LABELS.index(temporal) if temporal is not None else -1)
+            self.intensity.append(INTENSITY_LABELS.index(intensity) if intensity is not None else -1)
+        self.texts.append(text)
+        self.post_offsets.append(len(self.starts))
+
+    def __len__(self):
+        return len(self.texts)
+
+    def matches(self, i):
+        """Matches of post i as Match objects."""
+        text = self.texts[i]
+        out = []
+        for row in range(self.post_offsets[i], self.post_offsets[i + 1]):
+            temporal, intensity = self.temporal[row], self.intensity[row]
+            out.append(Match(
+                text, self.starts[row], self.ends[row], self.concept_codes[row],
+                MATCH_TYPES[self.match_types[row]], self.confidences[row], bool(self.negated[row]),
+                TEMPORAL_LABELS[temporal] if temporal >= 0 else None,
+                INTENSITY_LABELS[intensity] if intensity >= 0 else None,
+            ))
+        return out
+
+    def concept_ids(self, i):
+        """Concept IDs of post i's matches, in match order."""
+        lo, hi = self.post_offsets[i], self.post_offsets[i + 1]
+        return [CONCEPTS.ids[c] for c in self.concept_codes[lo:hi]]
+
+    def __iter__(self):
+        for i in range(len(self.texts)):
+            yield self.matches(i)
+
+    def nbytes(self):
+        """Approximate size of the columns in bytes (excluding the post texts)."""
+        columns = (self.post_offsets, self.starts, self.ends, self.concept_codes, self.confidences,
+                   self.match_types, self.negated, self.temporal, self.intensity)
+        return sum(col.itemsize * len(col) for col in columns)
@@ -0,0 +1,120 @@
+"""
+Persisted NER lexicon artifacts.
+
+The built OntologyNER lexicon is pickled to DATA/ner_artifacts/, keyed by a
+hash of its inputs and ARTIFACT_VERSION (bump it whenever the stored
+structures change), and reloaded on the next start. Prebuild it (e.g.
+before starting worker processes):
+
+    python src/ner_artifact.py --mode both
+
+Artifacts are loaded with pickle; do not load files from untrusted sources.
+"""
+import argparse
+import gc
+import hashlib
+import json
+import os
+import pickle
+import sys
+import time
+
+ARTIFACT_DIR = "DATA/ner_artifacts"
+ARTIFACT_VERSION = 6
+
+
+def file_digest(path):
+    """SHA-256 hex digest of a file's contents, or None if it does not exist."""
+    if not os.path.exists(path):
+        return None
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def artifact_key(ontology_path, **inputs):
+    """Key for the lexicon built from `ontology_path` and `inputs` (JSON-serializable), or None."""
+    ontology_digest = file_digest(ontology_path)
+    if ontology_digest is None:
+        return None
+    payload = json.dumps({"version": ARTIFACT_VERSION, "ontology": ontology_digest, **inputs},
+                         sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()[:20]
+
+
+def artifact_path(artifact_dir, key, suffix=".pkl"):
+    return os.path.join(artifact_dir, f"ner_{key}{suffix}")
+
+
+def load_artifact(artifact_dir, key, suffix=".pkl"):
+    """Return the stored state for `key`, or None if it is missing or unreadable."""
+    path = artifact_path(artifact_dir, key, suffix)
+    if not os.path.exists(path):
+        return None
+    # The state is millions of small objects that are never cyclic garbage; collecting while
+    # they are created more than doubles the load time
+    gc_was_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        with open(path, 'rb') as f:
+            artifact = pickle.load(f)
+    except Exception as e:
+        print(f"Ignoring unreadable NER artifact {path}: {e}")
+        return None
+    finally:
+        if gc_was_enabled:
+            gc.enable()
+    if not isinstance(artifact, dict) or artifact.get("version") != ARTIFACT_VERSION or artifact.get("key") != key:
+        print(f"Ignoring stale NER artifact {path}")
+        return None
+    return artifact["state"]
+
+
+def save_artifact(artifact_dir, key, state, suffix=".pkl"):
+    """Write `state` for `key` atomically, so concurrent starts never read a partial file."""
+    os.makedirs(artifact_dir, exist_ok=True)
+    path = artifact_path(artifact_dir, key, suffix)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    try:
+        with open(tmp_path, 'wb') as f:
+            pickle.dump({"version": ARTIFACT_VERSION, "key": key, "state": state}, f,
+                        protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, path)
+    except OSError as e:
+        print(f"Could not save NER artifact {path}: {e}")
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        return None
+    return path
+
+
+def main():
+    sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+    try:
+        from src.ner_engine import OntologyNER
+    except ImportError:
+        from ner_engine import OntologyNER
+
+    parser = argparse.ArgumentParser(description="Build the persisted NER lexicon artifacts")
+    parser.add_argument("--mode", choices=["baseline", "improved", "both"], default="both", help="Engine mode(s) to build")
+    parser.add_argument("--pass1-matcher", choices=["token", "regex"], default="token", help="Pass 1 matcher to build")
+    parser.add_argument("--artifact-dir", type=str, default=ARTIFACT_DIR, help="Artifact directory")
+    parser.add_argument("--force", action="store_true", help="Rebuild even if a current artifact exists")
+    args = parser.parse_args()
+
+    # Improved first: its build also writes the fuzzy index, and the baseline engine reuses the artifact
+    modes = {"baseline": [False], "improved": [True], "both": [True, False]}[args.mode]
+    for i, improved in enumerate(modes):
+        if args.force and i == 0:
+            OntologyNER(improved=improved, pass1_matcher=args.pass1_matcher, artifact_dir=args.artifact_dir,
+                        rebuild_artifact=True)
+        t0 = time.perf_counter()
+        ner = OntologyNER(improved=improved, pass1_matcher=args.pass1_matcher, artifact_dir=args.artifact_dir)
+        elapsed = time.perf_counter() - t0
+        print(f"{'Improved' if improved else 'Baseline'}: {ner.artifact_path} (startup {elapsed:.2f}s)")
+
+
+if __name__ == "__main__":
+    main()
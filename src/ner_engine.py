@@ -1,78 +1,358 @@
-import re
-import nltk
+import heapq
+import bisect
+import copy
+import gc
 import json
-from nltk.stem import WordNetLemmatizer
-from difflib import SequenceMatcher
+import os
+import threading
+from operator import attrgetter
 from typing import List, Dict, Tuple, Set
 
-# Ensure NLTK resources are available
 try:
-    nltk.data.find('corpora/wordnet')
-except LookupError:
-    nltk.download('wordnet', quiet=True)
-    nltk.download('omw-1.4', quiet=True)
-
-try:
-    from src.ontology_loader import load_hpo_ontology
+    from src.ontology_loader import JSON_CACHE_PATH
+    from src.lexicon_core import (LexiconCore, SubsetTermTable, get_lexicon_core, shared_ontology,
+                                  shared_pattern_scanner)
+    from src.ner_artifact import ARTIFACT_DIR, artifact_key, artifact_path, load_artifact, save_artifact
+    from src.lemma_table import CORPUS_LEMMAS_PATH, LemmaTable
+    from src.flat_lexicon import FlatLexicon
+    from src.matchers import build_pass1_matcher, EmojiMatcher, TokenStream
+    from src.context_cues import ContextAnnotator
+    from src.spans import IntervalSet
+    from src.matches import Match, MatchBatch
+    from src.concepts import CONCEPTS
+    from src.concept_filter import ConceptPrefilter
+    from src.fuzzy_index import FuzzyIndex, FuzzyMemo, ThreadCounters
+    from src.common_words import BUILTIN_COMMON_WORDS, COMMON_WORDS_PATH, load_common_words
+    from src.pass_stats import PassStats
+    from src.lexicon_data import (LEXICON_DIR, MANUAL_LEXICON_FILE, EMOJI_MAP_FILE, PASS2_PATTERNS_FILE,
+                                  load_lexicon_file)
 except ImportError:
-    from ontology_loader import load_hpo_ontology
+    from ontology_loader import JSON_CACHE_PATH
+    from lexicon_core import (LexiconCore, SubsetTermTable, get_lexicon_core, shared_ontology,
+                              shared_pattern_scanner)
+    from ner_artifact import ARTIFACT_DIR, artifact_key, artifact_path, load_artifact, save_artifact
+    from lemma_table import CORPUS_LEMMAS_PATH, LemmaTable
+    from flat_lexicon import FlatLexicon
+    from matchers import build_pass1_matcher, EmojiMatcher, TokenStream
+    from context_cues import ContextAnnotator
+    from spans import IntervalSet
+    from matches import Match, MatchBatch
+    from concepts import CONCEPTS
+    from concept_filter import ConceptPrefilter
+    from fuzzy_index import FuzzyIndex, FuzzyMemo, ThreadCounters
+    from common_words import BUILTIN_COMMON_WORDS, COMMON_WORDS_PATH, load_common_words
+    from pass_stats import PassStats
+    from lexicon_data import (LEXICON_DIR, MANUAL_LEXICON_FILE, EMOJI_MAP_FILE, PASS2_PATTERNS_FILE,
+                              load_lexicon_file)
+
+# Joins posts in extract_many(); it is neither a word nor a whitespace character, so no term
+# or pattern can match across it
+POST_SEPARATOR = "\x00"
+CONCAT_CHUNK_CHARS = 8192
+# Artifact file of the fuzzy index, next to the lexicon artifact with the same key
+FUZZY_INDEX_SUFFIX = ".fuzzy.pkl"
 
 class OntologyNER:
-    def __init__(self, improved=False):
+    def __init__(self, improved=False, pass1_matcher="token", fuzzy_threshold=0.85, fuzzy_cache_size=100000,
+                 common_words_path=COMMON_WORDS_PATH, artifact_dir=ARTIFACT_DIR, rebuild_artifact=False,
+                 lemmas_path=CORPUS_LEMMAS_PATH, shared_lexicon=False, collect_stats=False, lexicon_dir=LEXICON_DIR):
         self.improved = improved
+        self._fuzzy_threshold = fuzzy_threshold
+        self.fuzzy_cache_size = fuzzy_cache_size
         mode_str = "Improved (Two-Pass + Fuzzy + Negation)" if improved else "Baseline"
         print(f"Initializing OntologyNER ({mode_str} Mode)...")
         
-        # Load ontology data
-        ontology_data = load_hpo_ontology()
-        self.symptom_map = ontology_data.get('symptom_map', {})
-        self.hierarchy = ontology_data.get('hierarchy', {})
-        self.synonym_types = ontology_data.get('synonym_types', {})
-        self.metadata = ontology_data.get('metadata', {})
+        # Social media lexicon, emoji map and Pass 2 patterns: data files in `lexicon_dir` if present
+        self.lexicon_dir = lexicon_dir
+        manual_lexicon = self._get_manual_lexicon()
+        
+        # Lexicon (ontology terms, lemma table, fuzzy index, Pass 1 matcher): shared with the live
+        # engines of this process built from the same inputs, baseline or improved (see
+        # lexicon_core.py), else loaded from a persisted artifact when one matches them, otherwise
+        # built and saved
+        inputs = (pass1_matcher, lemmas_path, tuple(manual_lexicon.items()),
+                  os.path.abspath(artifact_dir) if artifact_dir is not None else None)
+        core, shared = get_lexicon_core(
+            inputs,
+            lambda: self._load_lexicon_core(manual_lexicon, pass1_matcher, artifact_dir, rebuild_artifact, lemmas_path),
+            reload=rebuild_artifact)
+        if shared:
+            print(f"Sharing NER lexicon core of another engine ({core.artifact_path or 'not persisted'})")
+        self.lexicon_core = core
+        self.artifact_path = core.artifact_path
+        lexicon = {"manual_lexicon": manual_lexicon, "flat_lexicon": None, **self._mode_state(core)}
+        # Optionally swap the big lookup structures for one flat mmap shared by all worker processes
+        if shared_lexicon:
+            lexicon.update(self._flat_views(core.derive(**lexicon), core.artifact_dir, core.artifact_key,
+                                            ".flat" if improved else ".baseline.flat"))
+            self.lexicon_core = None  # the dict structures are not needed; let them go with the core
+        
+        # Load emoji mappings, matched in one scan per post
+        lexicon.update(self._emoji_state(self._get_emoji_mappings()))
+        
+        # Pass 2: Pattern-based/Implicit Expressions, compiled once into a prefix-dispatched scanner
+        lexicon.update(self._pass2_state(self._get_pass2_patterns()))
+        
+        # Frequent English words skip fuzzy matching entirely (None disables the gate)
+        self.common_word_source = frozenset()
+        if improved and common_words_path is not None:
+            self.common_word_source = load_common_words(common_words_path)
+        self._gated_counts = ThreadCounters(1)
+        
+        # Negation/temporal/intensity cues, scanned once per post and resolved per match by bisect
+        self.context_annotator = ContextAnnotator() if improved else None
         
-        self.lemmatizer = WordNetLemmatizer() if improved else None
+        # Guards the lexicon's lazy caches; the fuzzy memo and lemma table lock themselves
+        self._lock = threading.Lock()
+        # Optional per-pass time and hit counters (see PassStats); None keeps extract() uninstrumented
+        self.stats = PassStats() if collect_stats else None
         
-        self.term_to_id = {}
-        all_terms = []
+        # Every extraction call reads self.lexicon once and runs on it; update_lexicon() and
+        # reload_lexicon() swap in a patched LexiconCore with one assignment
+        self._update_lock = threading.Lock()
+        self.lexicon = self._derive_lexicon(core, **lexicon)
+        
+        print(f"NER Initialized: {len(self.sorted_terms)} dictionary terms, {len(self.pass2_patterns)} contextual patterns, {len(self.emoji_map)} emoji mappings.")
+
+    # Attributes restored from (and stored in) the persisted lexicon artifact and held by the LexiconCore,
+    # which also holds the baseline view of them (see _mode_state())
+    LEXICON_STATE = ("lemmatizer", "term_to_id", "sorted_terms", "fuzzy_index", "pass1_matcher", "base_term_ids")
+
+    # State of the current lexicon (see _derive_lexicon()); read-only, it is replaced as a whole
+    lemmatizer = property(attrgetter("lexicon.lemmatizer"))
+    term_to_id = property(attrgetter("lexicon.term_to_id"))
+    sorted_terms = property(attrgetter("lexicon.sorted_terms"))
+    fuzzy_index = property(attrgetter("lexicon.fuzzy_index"))
+    pass1_matcher = property(attrgetter("lexicon.pass1_matcher"))
+    base_term_ids = property(attrgetter("lexicon.base_term_ids"))
+    manual_lexicon = property(attrgetter("lexicon.manual_lexicon"))
+    flat_lexicon = property(attrgetter("lexicon.flat_lexicon"))
+    emoji_map = property(attrgetter("lexicon.emoji_map"))
+    emoji_matcher = property(attrgetter("lexicon.emoji_matcher"))
+    emoji_codes = property(attrgetter("lexicon.emoji_codes"))
+    pass2_patterns = property(attrgetter("lexicon.pass2_patterns"))
+    pass2_scanner = property(attrgetter("lexicon.pass2_scanner"))
+    pass2_codes = property(attrgetter("lexicon.pass2_codes"))
+    common_words = property(attrgetter("lexicon.common_words"))
+    fuzzy_memo = property(attrgetter("lexicon.fuzzy_memo"))
+
+    # Ontology data, loaded on first access and shared by all engines (see lexicon_core.shared_ontology())
+    symptom_map = property(lambda self: shared_ontology()["symptom_map"])
+    hierarchy = property(lambda self: shared_ontology()["hierarchy"])
+    synonym_types = property(lambda self: shared_ontology()["synonym_types"])
+    metadata = property(lambda self: shared_ontology()["metadata"])
+
+    def _artifact_key(self, manual_lexicon, pass1_matcher):
+        """Artifact key for the current ontology cache, lexicon and settings (None if there is no cache yet)."""
+        return artifact_key(
+            JSON_CACHE_PATH,
+            module=__name__,  # pickled classes are looked up under the module names they were saved with
+            pass1_matcher=pass1_matcher,
+            lexicon=list(manual_lexicon.items()),
+        )
+
+    def _load_lexicon_core(self, manual_lexicon, pass1_matcher, artifact_dir, rebuild_artifact, lemmas_path):
+        """LexiconCore from the persisted artifact for the current inputs, or built (and saved)."""
+        path = None
+        key = self._artifact_key(manual_lexicon, pass1_matcher) if artifact_dir is not None and not rebuild_artifact else None
+        state = load_artifact(artifact_dir, key) if key is not None else None
+        if state is not None:
+            path = artifact_path(artifact_dir, key)
+            print(f"Loaded NER lexicon artifact: {path}")
+            views = {}
+        else:
+            state = self._build_lexicon(manual_lexicon, pass1_matcher)
+            # Only improved engines use the fuzzy index; it has an artifact file of its own
+            fuzzy_index = state.pop("fuzzy_index")
+            key = self._artifact_key(manual_lexicon, pass1_matcher) if artifact_dir is not None else None
+            if key is not None:
+                path = save_artifact(artifact_dir, key, state)
+                save_artifact(artifact_dir, key, fuzzy_index, FUZZY_INDEX_SUFFIX)
+            views = {True: {"fuzzy_index": fuzzy_index}} if self.improved else {}
+        state = dict(state, fuzzy_index=None, views=views)
+        # Concepts are held as interned integer codes (see concepts.py); the artifact keeps the IDs
+        state["term_to_id"] = CONCEPTS.intern_values(state["term_to_id"])
+        state["base_term_ids"] = CONCEPTS.intern_values(state["base_term_ids"])
+        baseline = state["baseline"] = dict(state["baseline"])
+        baseline["overrides"] = CONCEPTS.intern_values(baseline["overrides"])
+        baseline["base_term_ids"] = CONCEPTS.intern_values(baseline["base_term_ids"])
+        # Corpus vocabulary lemmas built offline (src/lemma_table.py); WordNet only sees unseen words
+        if lemmas_path and os.path.exists(lemmas_path):
+            state["lemmatizer"].load(lemmas_path)
+        return LexiconCore(state, artifact_dir if path is not None else None, key if path is not None else None, path)
+
+    def _mode_state(self, core):
+        """LEXICON_STATE of this engine's mode over the shared core: its fuzzy index (improved) or its baseline view."""
+        view = core.views.get(self.improved)
+        if view is None:
+            if self.improved:
+                view = {"fuzzy_index": self._load_fuzzy_index(core)}
+            else:
+                # The regex Pass 1 matcher is recompiled for the baseline terms
+                baseline = core.baseline
+                view = {
+                    "lemmatizer": None,
+                    "term_to_id": SubsetTermTable(core.term_to_id, baseline["excluded"], baseline["overrides"]),
+                    "sorted_terms": baseline["sorted_terms"],
+                    "fuzzy_index": None,
+                    "pass1_matcher": core.pass1_matcher.subset(baseline["sorted_terms"], baseline["excluded"]),
+                    "base_term_ids": baseline["base_term_ids"],
+                }
+            # Built once per core and mode; of two engines racing to build it, one view is kept
+            view = core.views.setdefault(self.improved, view)
+        return view
+
+    @staticmethod
+    def _load_fuzzy_index(core):
+        """The fuzzy index of the core's terms: from the core's artifact, else built (and saved)."""
+        key = core.artifact_key
+        index = load_artifact(core.artifact_dir, key, FUZZY_INDEX_SUFFIX) if key is not None else None
+        if index is not None:
+            index.share_terms(core.sorted_terms)
+        else:
+            index = FuzzyIndex(core.sorted_terms)
+            if key is not None:
+                save_artifact(core.artifact_dir, key, index, FUZZY_INDEX_SUFFIX)
+        return index
+
+    @staticmethod
+    def _flat_views(lexicon, artifact_dir, key, suffix=".flat"):
+        """FlatLexicon views of the term table, term list, Pass 1 term set and fuzzy index of `lexicon`."""
+        pass1_terms = getattr(lexicon.pass1_matcher, "terms", None)
+
+        def build():
+            return FlatLexicon.encode(lexicon.term_to_id, lexicon.sorted_terms, lexicon.fuzzy_index, pass1_terms or ())
+
+        if artifact_dir is not None:
+            flat = FlatLexicon.open(artifact_path(artifact_dir, key, suffix), build)
+        else:
+            flat = FlatLexicon.from_bytes(build())
+        views = {"flat_lexicon": flat, "term_to_id": flat.term_to_id, "sorted_terms": flat.sorted_terms}
+        if lexicon.fuzzy_index is not None:
+            views["fuzzy_index"] = flat.fuzzy_index
+        if pass1_terms is not None:
+            # The matcher may belong to a shared LexiconCore; the flat term set goes on a copy
+            views["pass1_matcher"] = copy.copy(lexicon.pass1_matcher)
+            views["pass1_matcher"].terms = flat.pass1_terms
+        return views
+
+    @staticmethod
+    def _emoji_state(emoji_map):
+        """Lexicon state of `emoji_map`: the map, its one-scan matcher and the emoji's concept codes."""
+        return {
+            "emoji_map": emoji_map,
+            "emoji_matcher": EmojiMatcher(emoji_map),
+            "emoji_codes": {emoji: CONCEPTS.code(s_id) for emoji, s_id in emoji_map.items()},
+        }
+
+    @staticmethod
+    def _pass2_state(patterns):
+        """Lexicon state of the Pass 2 `patterns`: the patterns, their shared scanner and concept codes."""
+        scanner = shared_pattern_scanner(patterns)
+        return {
+            "pass2_patterns": patterns,
+            "pass2_scanner": scanner,
+            "pass2_codes": [CONCEPTS.code(s_id) for s_id in scanner.concept_ids],
+        }
+
+    def _derive_lexicon(self, base, **changes):
+        """`base` with `changes` and this engine's own fresh gate words, fuzzy memo and lazy caches."""
+
+        term_to_id = changes.get("term_to_id", base.term_to_id)
+        fuzzy_index = changes.get("fuzzy_index", base.fuzzy_index)
+        return base.derive(common_words=self._gate_words(term_to_id, fuzzy_index),
+                           fuzzy_memo=FuzzyMemo(self.fuzzy_cache_size), caches={}, **changes)
+
+    @property
+    def fuzzy_gated(self):
+        """Words skipped by the common-word gate, summed over the per-thread counters."""
+        return self._gated_counts.totals()[0]
+
+    @property
+    def fuzzy_threshold(self):
+        return self._fuzzy_threshold
+
+    @fuzzy_threshold.setter
+    def fuzzy_threshold(self, threshold):
+        # The gate words and memoized fuzzy results depend on the threshold: derive them anew
+        with self._update_lock:
+            self._fuzzy_threshold = threshold
+            self.lexicon = self._derive_lexicon(self.lexicon)
+
+    def _build_lexicon(self, manual_lexicon, pass1_matcher):
+        """Build the lexicon from the ontology and the manual lexicon; returns the LEXICON_STATE values and the baseline view."""
+        # Load ontology data (once per process, shared by all engines)
+        symptom_map = shared_ontology()["symptom_map"]
+        lemmatizer = LemmaTable()
+        
+        # One lexicon serves both modes: the improved one, with lemmatized variants, is built
+        # alongside the baseline one, which is kept as the difference between the two
+        term_to_id, baseline_ids = {}, {}
+        all_terms, baseline_terms = [], []
         
         # Load formal HPO terms
-        for hp_id, synonyms in self.symptom_map.items():
+        for hp_id, synonyms in symptom_map.items():
             for syn in synonyms:
-                self._process_term(syn, hp_id, all_terms)
+                self._process_term(syn, hp_id, term_to_id, all_terms, lemmatizer)
+                self._process_term(syn, hp_id, baseline_ids, baseline_terms, None)
         
         # Load social media lexicon
         print("Integrating social media lexicon and informal variants...")
-        manual_lex = self._get_manual_lexicon()
-        for term, lex_id in manual_lex.items():
-            self._process_term(term, lex_id, all_terms, overwrite=True)
+        # Ontology concept (or None) of every key the lexicon writes, restored if update_lexicon() removes its terms
+        base_term_ids = {key: term_to_id.get(key)
+                         for term in manual_lexicon for key in self._term_variants(term, lemmatizer)}
+        baseline_base_ids = {key: baseline_ids.get(key)
+                             for term in manual_lexicon for key in self._term_variants(term, None)}
+        for term, lex_id in manual_lexicon.items():
+            self._process_term(term, lex_id, term_to_id, all_terms, lemmatizer, overwrite=True)
+            self._process_term(term, lex_id, baseline_ids, baseline_terms, None, overwrite=True)
         
-        # Load emoji mappings
-        self.emoji_map = self._get_emoji_mappings()
+        # Pass 1 spans are a term or term + 's' and are looked up with trailing s's stripped;
+        # lemmatize those keys now so matching never falls back to WordNet
+        if lemmatizer is not None:
+            for term in all_terms:
+                lemmatizer.lemmatize_phrase(term.rstrip('s'))
         
         # Sort terms by length desc for longest-match-first regex
         all_terms.sort(key=len, reverse=True)
-        self.sorted_terms = all_terms
-        
-        # Optimization: Bucket terms by length for faster fuzzy matching
-        self.terms_by_length = {}
-        for term in all_terms:
-            l = len(term)
-            if l not in self.terms_by_length:
-                self.terms_by_length[l] = []
-            self.terms_by_length[l].append(term)
-        
-        # Pass 1 Regex: Strict Dictionary/Synonym Match
-        self.pass1_regex = self._compile_regex(all_terms)
+        # The baseline term list holds the improved lexicon's strings, so the two share one copy
+        canonical = dict(zip(all_terms, all_terms))
+        baseline_terms = sorted((canonical[t] for t in baseline_terms), key=len, reverse=True)
         
-        # Pass 2 Regex: Pattern-based/Implicit Expressions
-        self.pass2_patterns = self._get_pass2_patterns()
-        
-        # Negation patterns
-        self.negation_patterns = self._get_negation_patterns()
-        
-        print(f"NER Initialized: {len(all_terms)} dictionary terms, {len(self.pass2_patterns)} contextual patterns, {len(self.emoji_map)} emoji mappings.")
+        return {
+            "lemmatizer": lemmatizer,
+            "term_to_id": term_to_id,
+            "sorted_terms": all_terms,
+            # Fuzzy index: bigram postings per (first char, length) bucket, queried per unmatched word
+            "fuzzy_index": FuzzyIndex(all_terms),
+            # Pass 1 Matcher: Strict Dictionary/Synonym Match
+            # "token" (default) does hashed longest-span lookups per token; "regex" is the original alternation
+            "pass1_matcher": build_pass1_matcher(pass1_matcher, all_terms),
+            "base_term_ids": base_term_ids,
+            # Baseline keys are a subset of the improved ones; a few take a different concept
+            # where a lemmatized variant of an earlier synonym wrote the key first
+            "baseline": {
+                "excluded": frozenset(term_to_id.keys() - baseline_ids.keys()),
+                "overrides": {key: s_id for key, s_id in baseline_ids.items() if term_to_id[key] != s_id},
+                "sorted_terms": baseline_terms,
+                "base_term_ids": baseline_base_ids,
+            },
+        }
+
+    def _get_manual_lexicon(self):
+        """The social media lexicon: manual_lexicon.json in the lexicon directory, or the built-in one."""
+        return load_lexicon_file(self.lexicon_dir, MANUAL_LEXICON_FILE, self._default_manual_lexicon)
 
     def _get_emoji_mappings(self):
+        """The emoji map: emoji_map.json in the lexicon directory, or the built-in one."""
+        return load_lexicon_file(self.lexicon_dir, EMOJI_MAP_FILE, self._default_emoji_mappings)
+
+    def _get_pass2_patterns(self):
+        """The Pass 2 patterns: pass2_patterns.json in the lexicon directory, or the built-in ones."""
+        return [tuple(p) for p in load_lexicon_file(self.lexicon_dir, PASS2_PATTERNS_FILE, self._default_pass2_patterns)]
+
+    @staticmethod
+    def _default_emoji_mappings():
         """Map common mental health related emojis to HPO IDs."""
         return {
             "😢": "HP:0000712",  # Sadness/Depression
@@ -94,7 +374,8 @@ class OntologyNER:
             "🤬": "HP:0000718",
         }
 
-    def _get_manual_lexicon(self):
+    @staticmethod
+    def _default_manual_lexicon():
         """Massively expanded social media lexicon for mental health."""
         return {
             # Depression & Sadness (HP:0000716)
@@ -339,7 +620,8 @@ class OntologyNER:
             "weight gain": "HP:0001822",
         }
 
-    def _get_pass2_patterns(self):
+    @staticmethod
+    def _default_pass2_patterns():
         """Expanded pattern-based and contextual phrase matching."""
         return [
             # Depression patterns (HP:0000716)
@@ -398,244 +680,565 @@ class OntologyNER:
             (r"\b(?:withdrawn|withdraw)\s+from\s+(?:everyone|friends|family)\b", "HP:0000716"),
         ]
 
-    def _get_negation_patterns(self):
-        """Patterns to detect negation context."""
-        return [
-            r"\b(?:not|no|never|neither|nor|none|nobody|nothing|nowhere)\s+\w+\s+",
-            r"\b(?:don't|doesn't|didn't|won't|wouldn't|can't|cannot|couldn't)\s+",
-            r"\b(?:no\s+longer|not\s+anymore|stopped\s+being)\s+",
-            r"\b(?:without|lacking|absent)\s+",
-        ]
+    def _process_term(self, syn, hp_id, term_to_id, all_terms, lemmatizer, overwrite=False):
+        for key in self._term_variants(syn, lemmatizer):
+            if key not in term_to_id or overwrite:
+                if key not in term_to_id:
+                    all_terms.append(key)
+                term_to_id[key] = hp_id
 
-    def _process_term(self, syn, hp_id, all_terms, overwrite=False):
+    def _term_variants(self, syn, lemmatizer):
+        """Dictionary keys of term `syn`: the cleaned term and, given a `lemmatizer` (improved mode), its lemmatized form."""
         clean_syn = syn.strip().lower()
-        if len(clean_syn) < 3: return
-        
-        if clean_syn not in self.term_to_id or overwrite:
-            if clean_syn not in self.term_to_id:
-                all_terms.append(clean_syn)
-            self.term_to_id[clean_syn] = hp_id
-            
-        if self.improved and self.lemmatizer:
-            lem_syn = " ".join([self.lemmatizer.lemmatize(w) for w in clean_syn.split()])
-            if (lem_syn != clean_syn) and (lem_syn not in self.term_to_id or overwrite):
-                if lem_syn not in self.term_to_id:
-                  all_terms.append(lem_syn)
-                self.term_to_id[lem_syn] = hp_id
-
-    def _compile_regex(self, terms):
-        escaped_terms = [re.escape(t) for t in terms]
-        if not escaped_terms: return None
-        pattern_str = r'\b(?:' + '|'.join(escaped_terms) + r')(?:\b|s\b)'  # Allow plural forms
-        try:
-            return re.compile(pattern_str, re.IGNORECASE)
-        except Exception as e:
-            print(f"Warning: Regex compilation failed ({e}).")
-            return None
+        if len(clean_syn) < 3:
+            return []
+        variants = [clean_syn]
+        if lemmatizer:
+            lem_syn = " ".join([lemmatizer.lemmatize(w) for w in clean_syn.split()])
+            if lem_syn != clean_syn:
+                variants.append(lem_syn)
+        return variants
+
+    def update_lexicon(self, add=None, remove=None):
+        """Add (`add`: {term: concept ID}) and remove (`remove`) social media lexicon terms, as a rebuild would."""
+        with self._update_lock:
+            lexicon = self.lexicon
+            manual_lexicon = dict(lexicon.manual_lexicon)
+            for term in remove or ():
+                if manual_lexicon.pop(term, None) is None:
+                    print(f"Warning: '{term}' is not in the social media lexicon; nothing to remove.")
+            for term, s_id in (add or {}).items():
+                manual_lexicon.pop(term, None)  # re-added terms move to the end, as in a rebuilt lexicon
+                manual_lexicon[term] = s_id
+            self.lexicon = self._derive_lexicon(lexicon, **self._patched_lexicon(lexicon, manual_lexicon))
+
+    def reload_lexicon(self):
+        """Re-read the lexicon data files and swap in what changed, as update_lexicon() does."""
+        with self._update_lock:
+            lexicon = self.lexicon
+            changes = self._patched_lexicon(lexicon, self._get_manual_lexicon())
+            emoji_map = self._get_emoji_mappings()
+            if emoji_map != lexicon.emoji_map:
+                changes.update(self._emoji_state(emoji_map))
+            patterns = self._get_pass2_patterns()
+            if patterns != lexicon.pass2_patterns:
+                changes.update(self._pass2_state(patterns))
+            self.lexicon = self._derive_lexicon(lexicon, **changes)
+
+    def _patched_lexicon(self, lexicon, manual_lexicon):
+        """Changes to `lexicon` that make `manual_lexicon` its social media lexicon (see update_lexicon())."""
+        old = lexicon.manual_lexicon
+        changed = [t for t in old if manual_lexicon.get(t) != old[t]] + [t for t in manual_lexicon if t not in old]
+        affected = {key for term in changed for key in self._term_variants(term, lexicon.lemmatizer)}
 
-    def _fuzzy_match(self, word, threshold=0.85):
-        """Find fuzzy matches for misspellings (optimized)."""
+        term_to_id = dict(lexicon.term_to_id)
+        base_term_ids = dict(lexicon.base_term_ids)
+        for key in affected:
+            base_term_ids.setdefault(key, term_to_id.get(key))
+        # Each key takes the concept of the last lexicon term writing it, else its ontology concept;
+        # keys new to the dictionary are ordered as the lexicon first writes them
+        resolved = {}
+        for term, s_id in manual_lexicon.items():
+            for key in self._term_variants(term, lexicon.lemmatizer):
+                if key in affected:
+                    resolved[key] = CONCEPTS.code(s_id)
+        for key in affected:
+            resolved.setdefault(key, base_term_ids[key])
+
+        added, removed = [], []
+        for key, s_id in resolved.items():
+            if s_id is None:
+                if term_to_id.pop(key, None) is not None:
+                    removed.append(key)
+            else:
+                if key not in term_to_id:
+                    added.append(key)
+                term_to_id[key] = s_id
+        # Keys only the lexicon writes follow the ontology keys in the order the lexicon first
+        # writes them, as in a rebuild; the keys of a re-added term move to the end
+        lexicon_keys = dict.fromkeys(key for term in manual_lexicon
+                                     for key in self._term_variants(term, lexicon.lemmatizer)
+                                     if base_term_ids[key] is None)
+        removed_keys, added_keys = set(removed), set(added)
+        kept = [t for t in lexicon.sorted_terms if t not in removed_keys]
+        old_order = [t for t in kept if t in lexicon_keys]
+        sorted_terms = [t for t in kept if t not in lexicon_keys] + list(lexicon_keys)
+        sorted_terms.sort(key=len, reverse=True)
+        new_order = [t for t in sorted_terms if t in lexicon_keys and t not in added_keys]
+        # Fuzzy partitions holding a key that changed places are rebuilt in the new order
+        moved = [t for pair in zip(old_order, new_order) if pair[0] != pair[1] for t in pair]
+        if lexicon.lemmatizer is not None:
+            for term in added:
+                lexicon.lemmatizer.lemmatize_phrase(term.rstrip('s'))
+
+        changes = {
+            "manual_lexicon": dict(manual_lexicon),
+            "base_term_ids": base_term_ids,
+            "term_to_id": term_to_id,
+            "sorted_terms": sorted_terms,
+            "pass1_matcher": lexicon.pass1_matcher.patched(sorted_terms, added, removed),
+        }
+        if lexicon.flat_lexicon is not None:
+            # The flat views cannot be patched; build a plain index and re-encode it
+            changes["fuzzy_index"] = FuzzyIndex(sorted_terms) if self.improved else None
+            changes.update(self._flat_views(lexicon.derive(**changes), None, None))
+        elif lexicon.fuzzy_index is not None:
+            changes["fuzzy_index"] = lexicon.fuzzy_index.patched(sorted_terms, added + removed + moved)
+        print(f"Lexicon updated: {len(added)} dictionary terms added, {len(removed)} removed, "
+              f"{len(affected) - len(added) - len(removed)} remapped.")
+        return changes
+
+    def _gate_words(self, term_to_id, fuzzy_index):
+        """The gate words that are not dictionary terms; the fuzzy hits are dropped from the built-in list too."""
+        words = [w for w in self.common_word_source if w not in term_to_id]
+        if self.common_word_source is BUILTIN_COMMON_WORDS:
+            # A corpus-built list is checked against the fuzzy index when it is built (see
+            # common_words.py); the built-in one is not, and gating a fuzzy hit would drop a match
+            words = [w for w in words if fuzzy_index.lookup(w, self.fuzzy_threshold) is None]
+        return frozenset(words)
+
+    def _fuzzy_match(self, word, threshold=None):
+        """Find fuzzy matches for misspellings via the precomputed bigram index."""
         if not self.improved or len(word) < 4:
             return None
         
-        word_lower = word.lower()
-        word_len = len(word_lower)
-        best_match = None
-        best_ratio = threshold
-        
-        # Optimization: Only check terms of similar length (±2 characters)
-        # Using pre-computed buckets to avoid iterating 48k terms
-        candidate_terms = []
-        for l in range(word_len - 2, word_len + 3):
-            if l in self.terms_by_length:
-                candidate_terms.extend(self.terms_by_length[l])
-        
-        # Limit candidate pool size if still too large
-        if len(candidate_terms) > 500:
-             # Heuristic: just take a subset or just skip fuzzy for very common lengths if slow
-             # For now, let's just slice it to check 'close' ones in the bucket (though buckets aren't sorted by similarity)
-             # Better approach: check exact length first, then +1, then -1
-             candidate_terms = candidate_terms[:500] 
-
-        comparisons_made = 0
-        max_comparisons = 200
+        return self._fuzzy_lookup(self.lexicon, word.lower(), threshold)
+
+    def _fuzzy_lookup(self, lexicon, word_lower, threshold=None):
+        if word_lower in lexicon.common_words:
+            self._gated_counts.local()[0] += 1
+            return None
+        if threshold is not None and threshold != self.fuzzy_threshold:
+            # Off-default thresholds bypass the memo
+            best_match = lexicon.fuzzy_index.lookup(word_lower, threshold)
+            return lexicon.term_to_id.get(best_match) if best_match else None
         
-        for term in candidate_terms:
-            if comparisons_made >= max_comparisons:
-                break
-                
-            # Quick check: first character match (massive speedup)
-            if term[0] != word_lower[0]:
+        memo = lexicon.fuzzy_memo
+        cached = memo.get(word_lower)
+        if cached is not FuzzyMemo.MISSING:
+            return cached
+        best_match = lexicon.fuzzy_index.lookup(word_lower, self.fuzzy_threshold)
+        s_id = lexicon.term_to_id.get(best_match) if best_match else None
+        memo.put(word_lower, s_id)
+        return s_id
+
+    def fuzzy_cache_stats(self):
+        """Hit/miss/eviction counters of the fuzzy lookup memo, plus words skipped by the gate."""
+        stats = self.lexicon.fuzzy_memo.stats()
+        stats["gated"] = self.fuzzy_gated
+        return stats
+
+    def extract(self, text):
+        """
+        Two-pass extraction strategy with fuzzy matching and negation detection.
+
+        Thread-safe: the lexicon, matchers and patterns are only read and the
+        counters are kept per thread; the shared fuzzy memo and lemma table
+        lock only to add an entry.
+        """
+        return self._extract(self.lexicon, text)
+
+    def _extract(self, lexicon, text, exact_spans=None, pattern_spans=None):
+        if self.stats is None:
+            return self._select_spans(self._collect_candidates(lexicon, text, exact_spans, pattern_spans))
+        timer = self.stats.timer()
+        candidates = self._collect_candidates(lexicon, text, exact_spans, pattern_spans, timer)
+        matches = self._select_spans(candidates)
+        timer.lap("selection", len(candidates))
+        timer.finish(matches)
+        return matches
+
+    def extract_columnar(self, texts):
+        """Extract every post in `texts` into one columnar MatchBatch."""
+        batch = MatchBatch()
+        for text in texts:
+            batch.append(text, self.extract(text))
+        return batch
+
+    def extract_many(self, texts, chunk_chars=CONCAT_CHUNK_CHARS):
+        """
+        extract() for every post in `texts`, with Pass 1 and Pass 2 run over concatenated chunks.
+
+        Posts are joined with POST_SEPARATOR into buffers of about
+        `chunk_chars` characters, and the Pass 1 matcher and the Pass 2 scan
+        each run once per buffer. Their spans are mapped back to (post,
+        local offset) by bisecting the post start offsets; the remaining
+        passes, context annotation and span selection run per post, so the
+        result equals [extract(t) for t in texts]. Non-ASCII posts (one wide
+        character would widen the whole buffer and slow every scan over it)
+        and posts that contain the separator skip the buffer and are
+        extracted one by one with extract().
+        """
+        lexicon = self.lexicon
+        texts = list(texts)
+        results = [None] * len(texts)
+        chunk, size = [], 0
+        for i, text in enumerate(texts):
+            if not text.isascii() or POST_SEPARATOR in text:
+                results[i] = self._extract(lexicon, text)
                 continue
+            chunk.append(i)
+            size += len(text) + 1
+            if size >= chunk_chars:
+                self._extract_concatenated(lexicon, texts, chunk, results)
+                chunk, size = [], 0
+        if chunk:
+            self._extract_concatenated(lexicon, texts, chunk, results)
+        return results
 
-            ratio = SequenceMatcher(None, word_lower, term).ratio()
-            comparisons_made += 1
-            
-            if ratio > best_ratio:
-                best_ratio = ratio
-                best_match = term
-                
-                # Early termination if we find a very good match
-                if ratio > 0.95:
-                    break
-        
-        return self.term_to_id.get(best_match) if best_match else None
+    def _extract_concatenated(self, lexicon, texts, indices, results):
+        posts = [texts[i] for i in indices]
+        buffer = POST_SEPARATOR.join(posts)
+        offsets, pos = [], 0
+        for text in posts:
+            offsets.append(pos)
+            pos += len(text) + 1
 
-    def _detect_negation(self, text, start, end):
-        """Check if a match is negated by looking at context."""
-        if not self.improved:
-            return False
-        
-        # Look at 30 characters before the match
-        context_start = max(0, start - 30)
-        context = text[context_start:start]
-        
-        for pattern in self.negation_patterns:
-            if re.search(pattern, context, re.IGNORECASE):
-                return True
-        
-        return False
+        timer = self.stats.timer() if self.stats is not None else None
+        tokens = TokenStream(buffer)
+        exact_spans = [[] for _ in posts]
+        if lexicon.pass1_matcher:
+            for start, end in lexicon.pass1_matcher.finditer(buffer, tokens):
+                k = bisect.bisect_right(offsets, start) - 1
+                exact_spans[k].append((start - offsets[k], end - offsets[k]))
+        if timer is not None:
+            timer.lap("pass1", calls=0)  # calls and candidates are counted per post
+        pattern_spans = [[] for _ in posts] if self.improved else None
+        if self.improved:
+            # The scan's order (pattern, then position) is kept within each post
+            for idx, start, end in lexicon.pass2_scanner.scan(buffer, tokens=tokens):
+                k = bisect.bisect_right(offsets, start) - 1
+                pattern_spans[k].append((idx, start - offsets[k], end - offsets[k]))
+            if timer is not None:
+                timer.lap("pass2", calls=0)
+        if timer is not None:
+            self.stats.merge(timer.counters)
 
-    def _extract_temporal_context(self, text, start, end):
-        """Extract temporal markers (past, present, future)."""
-        context_start = max(0, start - 40)
-        context = text[context_start:end]
-        
-        past_markers = [r"\b(?:used\s+to|was|were|had|did|ago|before|previously)\b"]
-        present_markers = [r"\b(?:am|is|are|currently|now|right\s+now|these\s+days)\b"]
-        future_markers = [r"\b(?:will|going\s+to|gonna|might|may|could)\b"]
-        
-        for pattern in past_markers:
-            if re.search(pattern, context, re.IGNORECASE):
-                return "past"
-        for pattern in present_markers:
-            if re.search(pattern, context, re.IGNORECASE):
-                return "present"
-        for pattern in future_markers:
-            if re.search(pattern, context, re.IGNORECASE):
-                return "future"
-        
-        return "present"  # Default
+        for k, (i, text) in enumerate(zip(indices, posts)):
+            spans = exact_spans[k] + (pattern_spans[k] if self.improved else [])
+            if any(span[-1] > len(text) for span in spans):
+                # Only reachable if a term or pattern could match the separator
+                results[i] = self._extract(lexicon, text)
+                continue
+            results[i] = self._extract(lexicon, text, exact_spans[k], pattern_spans[k] if self.improved else None)
 
-    def _extract_intensity(self, text, start, end):
-        """Extract intensity/severity modifiers."""
-        context_start = max(0, start - 30)
-        context = text[context_start:start]
-        
-        high_intensity = [r"\b(?:very|extremely|really|so|super|incredibly|unbearably)\b"]
-        low_intensity = [r"\b(?:a\s+bit|slightly|somewhat|kind\s+of|sort\s+of|a\s+little)\b"]
-        
-        for pattern in high_intensity:
-            if re.search(pattern, context, re.IGNORECASE):
-                return "high"
-        for pattern in low_intensity:
-            if re.search(pattern, context, re.IGNORECASE):
-                return "low"
-        
-        return "medium"
+    def extract_batch(self, texts, workers=1, chunksize=None, executor="process"):
+        """Extract `texts` (one match list per post, in order) in forked processes, or threads with executor="thread"."""
+        if executor not in ("process", "thread"):
+            raise ValueError(f"Unknown executor '{executor}'. Available: ['process', 'thread']")
+        texts = list(texts)
+        if workers is None:
+            workers = os.cpu_count() or 1
+        if workers <= 1 or len(texts) < 2:
+            return [self.extract(text) for text in texts]
+        if executor == "thread":
+            from concurrent.futures import ThreadPoolExecutor
+            chunksize = chunksize or max(1, -(-len(texts) // (workers * 4)))
+            chunks = [texts[i:i + chunksize] for i in range(0, len(texts), chunksize)]
+            with ThreadPoolExecutor(max_workers=min(workers, len(chunks))) as pool:
+                return [matches for chunk in pool.map(self._extract_chunk, chunks) for matches in chunk]
+        import multiprocessing
+        if "fork" not in multiprocessing.get_all_start_methods():
+            print("Warning: fork is unavailable on this platform; extracting serially.")
+            return [self.extract(text) for text in texts]
 
-    def extract(self, text):
-        """Two-pass extraction strategy with fuzzy matching and negation detection."""
+        # Objects that exist before the fork are moved out of the collector's reach, so
+        # collections in the workers do not write to (and un-share) the engine's pages;
+        # if the caller has frozen objects already, freezing is left to the caller
+        freeze = gc.get_freeze_count() == 0
+        if freeze:
+            gc.freeze()
+        try:
+            # The workers inherit the engine through the fork and find it via their initializer
+            with multiprocessing.get_context("fork").Pool(min(workers, len(texts)), _init_batch_worker, (self,)) as pool:
+                if self.stats is None:
+                    rows = pool.map(_extract_rows, texts, chunksize)
+                else:
+                    rows = []
+                    for post_rows, (posts, counters) in pool.map(_extract_rows_with_stats, texts, chunksize):
+                        rows.append(post_rows)
+                        self.stats.merge(counters, posts)
+        finally:
+            if freeze:
+                gc.unfreeze()
+        return [[Match(text, *row) for row in post_rows] for text, post_rows in zip(texts, rows)]
+
+    def _extract_chunk(self, texts):
+        return [self.extract(text) for text in texts]
+
+    def iter_extract(self, text, concept_ids=None):
+        """Yield the matches extract() would return, in start order, as soon as each is final."""
+        lexicon = self.lexicon
+        tokens = TokenStream(text)
+        if concept_ids is not None:
+            # IDs that were never registered cannot match
+            concept_ids = frozenset(code for code in map(CONCEPTS.lookup, concept_ids) if code is not None)
+            # Most triage posts are negative: rule them out before running the passes
+            if not self._concept_prefilter(lexicon, concept_ids).may_match(text, tokens):
+                return
+        cluster, cluster_end = [], 0
+        for rank, match in self._iter_candidates(lexicon, text, tokens):
+            if cluster and match.start >= cluster_end:
+                yield from self._resolve_cluster(text, cluster, concept_ids, tokens)
+                cluster = []
+            if not cluster or match.end > cluster_end:
+                cluster_end = match.end
+            cluster.append((rank, match))
+        if cluster:
+            yield from self._resolve_cluster(text, cluster, concept_ids, tokens)
+
+    def pass1_term_concepts(self, lexicon=None):
+        """Concept that Pass 1 spans of each term resolve to (plural strip, then lemma), built once per lexicon."""
+        lexicon = lexicon or self.lexicon
+        with self._lock:
+            resolved = lexicon.caches.get("pass1_term_concepts")
+            if resolved is None:
+                resolved = lexicon.caches["pass1_term_concepts"] = self._resolve_pass1_terms(lexicon)
+        return resolved
+
+    def _resolve_pass1_terms(self, lexicon):
+        resolved = {}
+        term_to_id = lexicon.term_to_id
+        for term in lexicon.sorted_terms:
+            # A span is the term or the term + 's'; both strip to the same lookup key
+            key = term.rstrip('s')
+            s_id = term_to_id.get(key)
+            if s_id is None and self.improved:
+                s_id = term_to_id.get(" ".join([lexicon.lemmatizer.lemmatize(w) for w in key.split()]))
+            if s_id is not None:
+                resolved[term] = s_id
+        return resolved
+
+    def _concept_prefilter(self, lexicon, concept_ids):
+        prefilter = lexicon.caches.get(concept_ids)
+        if prefilter is None:
+            # Built outside the lock; it calls pass1_term_concepts()
+            prefilter = ConceptPrefilter(self, lexicon, concept_ids)
+            with self._lock:
+                prefilter = lexicon.caches.setdefault(concept_ids, prefilter)
+        return prefilter
+
+    def has_any(self, text, concept_ids=None):
+        """True if extract(text) would contain a match (of one of `concept_ids`, if given)."""
+        return self.first_match(text, concept_ids) is not None
+
+    def first_match(self, text, concept_ids=None):
+        """The earliest match extract(text) would return (restricted to `concept_ids`), or None."""
+        return next(self.iter_extract(text, concept_ids), None)
+
+    def _collect_candidates(self, lexicon, text, exact_spans=None, pattern_spans=None, timer=None):
+        """
+        Run every matching pass and annotate context; returns overlapping candidate matches.
+
+        `exact_spans` / `pattern_spans` are Pass 1 / Pass 2 results already
+        found for `text` (see extract_many()); the pass is run when None.
+        Each pass is charged to `timer` (a PassTimer), if given. The post is
+        tokenized once and every pass reads the same TokenStream.
+        """
+        tokens = TokenStream(text)
         all_raw_matches = []
+        # Union of candidate spans found so far, for bisect coverage checks in later passes
+        matched_spans = IntervalSet()
 
         # PASS 0: Emoji extraction
         if self.improved:
-            for emoji, hp_id in self.emoji_map.items():
-                idx = 0
-                while idx < len(text):
-                    idx = text.find(emoji, idx)
-                    if idx == -1:
-                        break
-                    match_dict = self._create_match_dict(emoji, hp_id, idx, idx + len(emoji))
-                    match_dict['match_type'] = 'emoji'
-                    match_dict['confidence'] = 0.9
-                    all_raw_matches.append(match_dict)
-                    idx += len(emoji)
+            for match in self._emoji_candidates(lexicon, text):
+                all_raw_matches.append(match)
+                matched_spans.add(match.start, match.end)
+            if timer is not None:
+                timer.lap("emoji", len(all_raw_matches))
 
         # PASS 1: Dictionary & Synonym Match
-        if self.pass1_regex:
-            for m in self.pass1_regex.finditer(text):
-                raw_match = m.group()
-                match_lower = raw_match.lower().rstrip('s')  # Handle plurals
-                s_id = self.term_to_id.get(match_lower)
-                
-                if not s_id and self.improved:
-                    # Try lemmatization
-                    lem_match = " ".join([self.lemmatizer.lemmatize(w) for w in match_lower.split()])
-                    s_id = self.term_to_id.get(lem_match)
-                
-                if s_id:
-                    match_dict = self._create_match_dict(raw_match, s_id, m.start(), m.end())
-                    match_dict['match_type'] = 'exact'
-                    match_dict['confidence'] = 1.0
-                    all_raw_matches.append(match_dict)
+        n_before = len(all_raw_matches)
+        for match in self._exact_candidates(lexicon, text, exact_spans, tokens):
+            all_raw_matches.append(match)
+            matched_spans.add(match.start, match.end)
+        if timer is not None:
+            timer.lap("pass1", len(all_raw_matches) - n_before)
 
         # PASS 1.5: Fuzzy matching for unmatched words
         if self.improved:
-            words = re.finditer(r'\b\w{4,}\b', text)
-            for word_match in words:
-                word = word_match.group()
-                # Skip if already matched
-                if any(m['start'] <= word_match.start() < m['end'] for m in all_raw_matches):
+            n_before = len(all_raw_matches)
+            starts = tokens.starts
+            for k, word in enumerate(tokens.words):
+                # Skip short and already matched words
+                if len(word) < 4 or matched_spans.covers(starts[k]):
                     continue
-                
-                fuzzy_id = self._fuzzy_match(word)
-                if fuzzy_id:
-                    match_dict = self._create_match_dict(word, fuzzy_id, word_match.start(), word_match.end())
-                    match_dict['match_type'] = 'fuzzy'
-                    match_dict['confidence'] = 0.8
-                    all_raw_matches.append(match_dict)
+                match = self._fuzzy_candidate(lexicon, tokens, k)
+                if match:
+                    all_raw_matches.append(match)
+                    matched_spans.add(match.start, match.end)
+            if timer is not None:
+                timer.lap("fuzzy", len(all_raw_matches) - n_before)
 
         # PASS 2: Pattern-based & Contextual Match
         if self.improved:
-            for pattern, s_id in self.pass2_patterns:
-                for m in re.finditer(pattern, text, re.IGNORECASE):
-                    match_dict = self._create_match_dict(m.group(), s_id, m.start(), m.end())
-                    match_dict['match_type'] = 'pattern'
-                    match_dict['confidence'] = 0.85
-                    all_raw_matches.append(match_dict)
-
-        # Negation detection and context extraction
-        for match in all_raw_matches:
-            if self._detect_negation(text, match['start'], match['end']):
-                match['negated'] = True
-                match['confidence'] *= 0.3  # Reduce confidence for negated
-            else:
-                match['negated'] = False
+            n_before = len(all_raw_matches)
+            all_raw_matches.extend(self._pattern_candidates(lexicon, text, pattern_spans, tokens))
+            if timer is not None:
+                timer.lap("pass2", len(all_raw_matches) - n_before)
+
+        self._annotate_context(text, all_raw_matches, tokens)
+        if timer is not None and self.improved:
+            timer.lap("context", len(all_raw_matches))
+        return all_raw_matches
+
+    def _emoji_candidates(self, lexicon, text):
+        return [Match(text, start, end, lexicon.emoji_codes[emoji], 'emoji', 0.9)
+                for emoji, start, end in lexicon.emoji_matcher.finditer(text)]
+
+    def _exact_candidates(self, lexicon, text, spans=None, tokens=None):
+        """Pass 1 matches, generated in start order."""
+        if tokens is None:
+            tokens = TokenStream(text)
+        if spans is None:
+            if not lexicon.pass1_matcher:
+                return
+            spans = lexicon.pass1_matcher.finditer(text, tokens)
+        term_to_id = lexicon.term_to_id
+        folded = tokens.folded if tokens.plain else None
+        for start, end in spans:
+            match_lower = folded[start:end] if folded is not None else text[start:end].lower()
+            match_lower = match_lower.rstrip('s')  # Handle plurals
+            s_id = term_to_id.get(match_lower)
             
-            if self.improved:
-                match['temporal'] = self._extract_temporal_context(text, match['start'], match['end'])
-                match['intensity'] = self._extract_intensity(text, match['start'], match['end'])
+            if s_id is None and self.improved:
+                # Try lemmatization
+                lem_match = " ".join([lexicon.lemmatizer.lemmatize(w) for w in match_lower.split()])
+                s_id = term_to_id.get(lem_match)
+            
+            if s_id is not None:
+                yield Match(text, start, end, s_id, 'exact', 1.0)
+
+    def _fuzzy_candidate(self, lexicon, tokens, k):
+        """Fuzzy match for token `k` (at least 4 characters long) of `tokens`."""
+        start, end = tokens.starts[k], tokens.ends[k]
+        word = tokens.words[k] if tokens.plain else tokens.text[start:end].lower()
+        fuzzy_id = self._fuzzy_lookup(lexicon, word)
+        if fuzzy_id is not None:
+            return Match(tokens.text, start, end, fuzzy_id, 'fuzzy', 0.8)
+        return None
 
-        # Greedy Span Selection: Favor longer matches
-        all_raw_matches.sort(key=lambda x: (x['end'] - x['start'], x['confidence']), reverse=True)
+    def _pattern_candidates(self, lexicon, text, spans=None, tokens=None):
+        codes = lexicon.pass2_codes
+        if spans is None:
+            spans = lexicon.pass2_scanner.scan(text, tokens=tokens)
+        return [Match(text, start, end, codes[idx], 'pattern', 0.85)
+                for idx, start, end in spans]
+
+    def _annotate_context(self, text, matches, tokens=None):
+        """Negation detection and context extraction"""
+        if not (self.improved and matches):
+            return
+        cues = self.context_annotator.annotate(text, [(m.start, m.end) for m in matches], tokens)
+        for match in matches:
+            if cues.negated(match.start):
+                match.negated = True
+                match.confidence *= 0.3  # Reduce confidence for negated
+            match.temporal = cues.temporal(match.start, match.end)
+            match.intensity = cues.intensity(match.start)
+
+    def _iter_candidates(self, lexicon, text, tokens):
+        """
+        Yield (rank, match) for every candidate in start order.
+
+        Sorting by rank restores the order _collect_candidates() produces
+        (emoji, exact, fuzzy, pattern), which span selection uses to break ties.
+        """
+        matched_spans = IntervalSet()
+        upfront = []
+        if self.improved:
+            for i, match in enumerate(self._emoji_candidates(lexicon, text)):
+                upfront.append(((0, i), match))
+                matched_spans.add(match.start, match.end)
+            upfront.extend(((3, i), match)
+                           for i, match in enumerate(self._pattern_candidates(lexicon, text, tokens=tokens)))
+            upfront.sort(key=lambda c: c[1].start)
+        return heapq.merge(upfront, self._iter_exact_and_fuzzy(lexicon, text, tokens, matched_spans),
+                           key=lambda c: c[1].start)
+
+    def _iter_exact_and_fuzzy(self, lexicon, text, tokens, matched_spans):
+        """Pass 1 and Pass 1.5 interleaved in start order."""
+        exact = self._exact_candidates(lexicon, text, tokens=tokens)
+        pending = next(exact, None)
+        n_exact = n_fuzzy = 0
+        if self.improved:
+            starts = tokens.starts
+            for k, word in enumerate(tokens.words):
+                if len(word) < 4:
+                    continue
+                # Exact matches starting at or before this word are the only ones that can cover it
+                while pending is not None and pending.start <= starts[k]:
+                    matched_spans.add(pending.start, pending.end)
+                    yield (1, n_exact), pending
+                    n_exact += 1
+                    pending = next(exact, None)
+                if matched_spans.covers(starts[k]):
+                    continue
+                match = self._fuzzy_candidate(lexicon, tokens, k)
+                if match:
+                    matched_spans.add(match.start, match.end)
+                    yield (2, n_fuzzy), match
+                    n_fuzzy += 1
+        while pending is not None:
+            yield (1, n_exact), pending
+            n_exact += 1
+            pending = next(exact, None)
+
+    def _resolve_cluster(self, text, cluster, concept_ids, tokens):
+        if concept_ids is not None and not any(match.code in concept_ids for _, match in cluster):
+            return
+        cluster.sort(key=lambda c: c[0])
+        matches = [match for _, match in cluster]
+        self._annotate_context(text, matches, tokens)
+        for match in self._select_spans(matches):
+            if concept_ids is None or match.code in concept_ids:
+                yield match
+
+    def _select_spans(self, all_raw_matches):
+        """Greedy Span Selection: Favor longer matches"""
+        all_raw_matches.sort(key=lambda x: (x.end - x.start, x.confidence), reverse=True)
         
         final_results = []
-        covered_indices = [False] * len(text)
+        # Union of accepted spans; overlap queries bisect instead of scanning a per-character array
+        covered = IntervalSet()
         
         for match in all_raw_matches:
-            start, end = match['start'], match['end']
+            start, end = match.start, match.end
             # Allow some overlap for different concepts
-            overlap_count = sum(covered_indices[start:end])
+            overlap_count = covered.overlap(start, end)
             if overlap_count < (end - start) * 0.5:  # Less than 50% overlap
                 final_results.append(match)
-                for i in range(start, end):
-                    covered_indices[i] = True
+                covered.add(start, end)
         
         # Sort by position for output
-        return sorted(final_results, key=lambda x: x['start'])
+        return sorted(final_results, key=lambda x: x.start)
+
+# Engine of a forked extract_batch() worker process, set by its initializer
+_BATCH_ENGINE = None
+
+
+def _init_batch_worker(engine):
+    global _BATCH_ENGINE
+    _BATCH_ENGINE = engine
+
+
+def _extract_rows(text):
+    """Worker side of extract_batch(): matches as Match constructor arguments, without the post text."""
+    return [(m.start, m.end, m.code, m.match_type, m.confidence, m.negated, m.temporal, m.intensity)
+            for m in _BATCH_ENGINE.extract(text)]
+
+
+def _extract_rows_with_stats(text):
+    """_extract_rows() plus the worker's PassStats counters for this post, merged by the parent."""
+    stats = _BATCH_ENGINE.stats
+    stats.reset()
+    rows = _extract_rows(text)
+    return rows, stats.snapshot()
 
-    def _create_match_dict(self, text, s_id, start, end):
-        return {
-            "text": text,
-            "term": text.lower(),
-            "id": s_id,
-            "start": start,
-            "end": end
-        }
 
 if __name__ == "__main__":
     ner = OntologyNER(improved=True)
     test_text = "I've been feeling so low lately and can't sleep. My heart is pounding and I want to just disappear. 😢"
-    print("Extracted Symptoms:", json.dumps(ner.extract(test_text), indent=2))
+    print("Extracted Symptoms:", json.dumps([m.to_dict() for m in ner.extract(test_text)], indent=2))
 
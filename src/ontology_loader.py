@@ -1,6 +1,4 @@
 import os
-import owlready2
-from owlready2 import get_ontology, default_world
 import json
 from typing import Dict, List, Set, Tuple
 
@@ -134,6 +132,9 @@ def load_hpo_ontology(force_reload=False):
         if cached_data:
             return cached_data
     
+    # owlready2 is only needed to parse the OWL file, not to read the JSON cache
+    from owlready2 import get_ontology
+    
     # Create data dir if not exists
     os.makedirs("DATA", exist_ok=True)
     
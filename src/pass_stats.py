@@ -0,0 +1,121 @@
+import json
+import os
+import threading
+from time import perf_counter
+
+# Extraction passes in the order extract() runs them
+PASSES = ("emoji", "pass1", "fuzzy", "pass2", "context", "selection")
+# Match.match_type -> the pass that produced the candidate
+PASS_OF_MATCH_TYPE = {"emoji": "emoji", "exact": "pass1", "fuzzy": "fuzzy", "pattern": "pass2"}
+
+
+class PassStats:
+    """
+    Cumulative per-pass counters of OntologyNER extraction, enabled with collect_stats=True.
+
+    Covers extract(), extract_many() and extract_batch() (forked workers
+    send their counters back with the matches); iter_extract() is not
+    instrumented.
+
+    For each pass: wall time, calls, candidates produced (context: matches
+    annotated; selection: matches considered) and accepted (candidates of
+    the pass kept by span selection; selection: all kept matches). Each
+    post counts into a PassTimer of its own and merges it here once, under
+    a lock, so threads can share one PassStats.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.posts = 0
+            # pass -> [seconds, calls, candidates, accepted]
+            self.counters = {name: [0.0, 0, 0, 0] for name in PASSES}
+
+    def timer(self):
+        return PassTimer(self)
+
+    def merge(self, counters, posts=0):
+        """Add `counters` (pass -> [seconds, calls, candidates, accepted]) and `posts`."""
+        with self._lock:
+            self.posts += posts
+            for name, values in counters.items():
+                totals = self.counters[name]
+                for i, value in enumerate(values):
+                    totals[i] += value
+
+    def snapshot(self):
+        """(posts, copy of the counters), for merging into another PassStats."""
+        with self._lock:
+            return self.posts, {name: list(values) for name, values in self.counters.items()}
+
+    def to_dict(self):
+        posts, counters = self.snapshot()
+        return {
+            "posts": posts,
+            "passes": {
+                name: {"time_s": round(seconds, 6), "calls": calls, "candidates": candidates, "accepted": accepted}
+                for name, (seconds, calls, candidates, accepted) in counters.items()
+            },
+        }
+
+    def to_json(self, indent=2):
+        return json.dumps(self.to_dict(), indent=indent)
+
+    def dump(self, path):
+        """Write to_json() to `path`."""
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(self.to_json())
+
+    def format_table(self):
+        """The counters as an aligned text table."""
+        posts, counters = self.snapshot()
+        total = sum(values[0] for values in counters.values())
+        lines = [f"  {'pass':<10} {'time (ms)':>10} {'share':>6} {'calls':>8} {'candidates':>11} {'accepted':>9}"]
+        for name, (seconds, calls, candidates, accepted) in counters.items():
+            share = seconds / total * 100 if total > 0 else 0.0
+            lines.append(f"  {name:<10} {seconds * 1000:10.1f} {share:5.1f}% {calls:8d} {candidates:11d} {accepted:9d}")
+        lines.append(f"  {'total':<10} {total * 1000:10.1f} ms over {posts} posts")
+        return "\n".join(lines)
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state.pop('_lock', None)
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+
+class PassTimer:
+    """Counters of one extraction, merged into its PassStats by finish()."""
+    __slots__ = ("stats", "counters", "last")
+
+    def __init__(self, stats):
+        self.stats = stats
+        self.counters = {}
+        self.last = perf_counter()
+
+    def lap(self, name, candidates=0, calls=1):
+        """Charge the time since the previous lap to pass `name`."""
+        now = perf_counter()
+        values = self.counters.get(name)
+        if values is None:
+            values = self.counters[name] = [0.0, 0, 0, 0]
+        values[0] += now - self.last
+        values[1] += calls
+        values[2] += candidates
+        self.last = now
+
+    def finish(self, matches, posts=1):
+        """Count the accepted `matches` per pass and merge into the PassStats."""
+        counters = self.counters
+        for match in matches:
+            counters[PASS_OF_MATCH_TYPE[match.match_type]][3] += 1
+        if matches:
+            counters["selection"][3] += len(matches)
+        self.stats.merge(counters, posts)
@@ -1,21 +1,29 @@
-import pandas as pd
 import argparse
 import os
 try:
     from src.ner_engine import OntologyNER
     from src.kg_builder import KGBuilder
-    from src.ontology_loader import load_hpo_ontology
+    from src.lexicon_data import LEXICON_DIR
 except ImportError:
     from ner_engine import OntologyNER
     from kg_builder import KGBuilder
-    from ontology_loader import load_hpo_ontology
+    from lexicon_data import LEXICON_DIR
 
 def main():
+    import pandas as pd
+    
     parser = argparse.ArgumentParser(description="Mental Health KG Pipeline with Enhanced NER")
     parser.add_argument("--limit", type=int, default=0, help="Limit number of rows to process")
     parser.add_argument("--input", type=str, default="DATA/dreaddit-train.csv", help="Input CSV file")
     parser.add_argument("--min-confidence", type=float, default=0.6, help="Minimum confidence threshold for symptoms")
     parser.add_argument("--remove-negated", action="store_true", help="Remove negated symptoms from extraction")
+    parser.add_argument("--workers", type=int, default=1, help="NER workers (0 = one per CPU)")
+    parser.add_argument("--executor", choices=["process", "thread"], default="process", help="Run NER workers as forked processes or threads")
+    parser.add_argument("--chunksize", type=int, default=None, help="Posts per worker task (default: automatic)")
+    parser.add_argument("--shared-lexicon", action="store_true", help="Keep the NER lexicon in one memory-mapped copy shared by all workers")
+    parser.add_argument("--ner-stats", action="store_true", help="Print per-pass NER timing and hit counters at the end")
+    parser.add_argument("--ner-stats-json", type=str, default=None, help="Also write the per-pass NER counters to this JSON file")
+    parser.add_argument("--lexicon-dir", type=str, default=LEXICON_DIR, help="Directory of NER lexicon data files (built-in data where absent)")
     
     # Neo4j Args
     parser.add_argument("--neo4j-uri", default="neo4j+s://0525af13.databases.neo4j.io", help="Neo4j URI")
@@ -40,48 +48,39 @@ def main():
     
     # 2. Initialize Components
     print("Initializing enhanced NER system...")
-    ontology_data = load_hpo_ontology()
-    ner = OntologyNER(improved=True)  # Use improved mode for better recall
+    collect_stats = args.ner_stats or args.ner_stats_json is not None
+    ner = OntologyNER(improved=True, shared_lexicon=args.shared_lexicon, collect_stats=collect_stats,
+                      lexicon_dir=args.lexicon_dir)  # Use improved mode for better recall
     kg = KGBuilder()
     
     print(f"Configuration:")
     print(f"  - Min confidence: {args.min_confidence}")
     print(f"  - Remove negated: {args.remove_negated}")
     print(f"  - Improved NER: Enabled")
+    print(f"  - NER workers: {args.workers or os.cpu_count()} ({args.executor})")
+    print(f"  - Shared lexicon: {args.shared_lexicon}")
     
     # 3. Process
-    all_extractions = []
     total_raw_mentions = 0
     total_normalized_symptoms = 0
     
     # For progress tracking
     total = len(df)
     
-    for i, row in df.iterrows():
-        text = str(row.get('text', ''))
-        
-        # Extract raw matches
-        raw_matches = ner.extract(text)
+    # Extract raw matches (forked workers share the initialized engine)
+    texts = [str(row.get('text', '')) for _, row in df.iterrows()]
+    results = ner.extract_batch(texts, workers=args.workers or None, chunksize=args.chunksize, executor=args.executor)
+    
+    for i, raw_matches in zip(df.index, results):
         total_raw_mentions += len(raw_matches)
         
-        # Normalize and Filter (Inline)
-        valid_matches = []
-        for m in raw_matches:
-            if args.remove_negated and m.get('negated'):
-                continue
-            if m.get('confidence', 0) < args.min_confidence:
-                continue
-            valid_matches.append(m)
-            
-        # Deduplicate by ID
-        concept_ids = list(set([m['id'] for m in valid_matches]))
-        total_normalized_symptoms += len(concept_ids)
-        
-        # Convert back to match format for KG builder compatibility
-        clean_matches = [{'id': concept_id} for concept_id in concept_ids]
+        # Normalize, filter and deduplicate by concept, on interned integer codes
+        codes = {m.code for m in raw_matches
+                 if m.confidence >= args.min_confidence and not (args.remove_negated and m.negated)}
+        total_normalized_symptoms += len(codes)
         
-        # Ingest into KG (Concept-level only)
-        kg.collect_symptoms(clean_matches)
+        # Ingest into KG (Concept-level only; IDs are materialized at export)
+        kg.collect_codes(codes)
         
         if i % 100 == 0:
             print(f"Processed {i}/{total}... (Raw: {total_raw_mentions}, Normalized: {total_normalized_symptoms})")
@@ -91,6 +90,14 @@ def main():
     print(f"Total raw mentions: {total_raw_mentions}")
     print(f"Total normalized unique symptoms: {total_normalized_symptoms}")
     print(f"Deduplication rate: {((total_raw_mentions - total_normalized_symptoms) / max(total_raw_mentions, 1) * 100):.1f}%")
+    memo = ner.fuzzy_cache_stats()
+    print(f"Fuzzy memo: {memo['hits']} hits, {memo['misses']} misses, {memo['evictions']} evictions ({memo['size']} words cached), {memo['gated']} common words skipped")
+    if ner.stats is not None:
+        print("NER passes:")
+        print(ner.stats.format_table())
+        if args.ner_stats_json:
+            ner.stats.dump(args.ner_stats_json)
+            print(f"NER pass stats written to {args.ner_stats_json}")
     
     # 5. Export
     print("\nExporting KG...")
@@ -1,26 +1,20 @@
-import pandas as pd
 import argparse
 import os
 import re
-import nltk
 import ast
 import sys
-from nltk.stem import WordNetLemmatizer
 
 # Ensure src is in path
 sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
 
-# Ensure NLTK resources
-try:
-    nltk.data.find('corpora/wordnet')
-except LookupError:
-    nltk.download('wordnet', quiet=True)
-    nltk.download('omw-1.4', quiet=True)
-
 try:
     from src.ner_engine import OntologyNER
+    from src.lemma_table import load_lemma_table
+    from src.concepts import CONCEPTS
 except ImportError:
     from ner_engine import OntologyNER
+    from lemma_table import load_lemma_table
+    from concepts import CONCEPTS
 
 # Validation Data (Internal Fallback)
 HARDCODED_EXAMPLES = [
@@ -45,6 +39,7 @@ def load_dreaddit_lookup(dreaddit_path="DATA/dreaddit-train.csv"):
     """Loads a lookup dictionary from post_id to text."""
     if not os.path.exists(dreaddit_path):
         return {}
+    import pandas as pd
     try:
         df = pd.read_csv(dreaddit_path)
         return dict(zip(df['id'], df['text']))
@@ -53,6 +48,7 @@ def load_dreaddit_lookup(dreaddit_path="DATA/dreaddit-train.csv"):
 
 def parse_gold_entry(entry, ner_engine):
     """Parses a gold entry into a set of HPO Concept IDs."""
+    import pandas as pd
     if pd.isna(entry) or str(entry).strip() == "":
         return set()
     
@@ -70,12 +66,13 @@ def parse_gold_entry(entry, ner_engine):
     concept_ids = set()
     for term in terms:
         term_lower = str(term).lower()
+        # term_to_id holds interned concept codes; predictions are compared by ID string
         c_id = ner_engine.term_to_id.get(term_lower)
-        if not c_id and ner_engine.lemmatizer:
+        if c_id is None and ner_engine.lemmatizer:
              lem_term = " ".join([ner_engine.lemmatizer.lemmatize(w) for w in term_lower.split()])
              c_id = ner_engine.term_to_id.get(lem_term)
-        if c_id:
-            concept_ids.add(c_id)
+        if c_id is not None:
+            concept_ids.add(CONCEPTS.concept_id(c_id))
     return concept_ids
 
 def get_tokens(text):
@@ -83,7 +80,7 @@ def get_tokens(text):
     return set(re.findall(r'\w+', text.lower()))
 
 def lemmatize_text(text, lemmatizer):
-    """Lemmatizes a string (multi-word aware)."""
+    """Lemmatizes a string (multi-word aware) with a LemmaTable or any object with lemmatize()."""
     return " ".join([lemmatizer.lemmatize(w) for w in text.split()])
 
 def is_relaxed_match(gold, pred, threshold=0.5):
@@ -167,7 +164,10 @@ def run_evaluation_suite(df, ner, name, mode="strict", param=None, lookup=None):
     total_gold = 0
     
     sample_errors = []
-    lemmatizer = WordNetLemmatizer() if mode == "concept" else None
+    lemmatizer = None
+    if mode == "concept":
+        # The engine's lemma table (lexicon + corpus lemmas); WordNet only for unseen words
+        lemmatizer = ner.lemmatizer if ner.lemmatizer is not None else load_lemma_table()
 
     for _, row in df.iterrows():
         text = str(row.get('text', ''))
@@ -214,6 +214,7 @@ def run_evaluation_suite(df, ner, name, mode="strict", param=None, lookup=None):
     return stats, sample_errors
 
 def main(annotated_file):
+    import pandas as pd
     if os.path.exists(annotated_file):
         df = pd.read_csv(annotated_file)
         # Handle flexible column naming
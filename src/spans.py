@@ -0,0 +1,61 @@
+from bisect import bisect_left, bisect_right
+
+
+class IntervalSet:
+    """
+    Union of half-open [start, end) character spans.
+
+    The disjoint intervals are stored as one sorted boundary list
+    [s0, e0, s1, e1, ...], so a position is covered exactly when an odd number
+    of boundaries lie at or before it. This replaces per-character coverage
+    arrays: memory is proportional to the number of accepted spans instead of
+    the text length, and each query or insert is one bisect plus the few
+    intervals it touches.
+    """
+
+    def __init__(self, spans=()):
+        self.bounds = []
+        for start, end in spans:
+            self.add(start, end)
+
+    def add(self, start, end):
+        """Add [start, end), merging with any interval it overlaps or touches."""
+        if start >= end:
+            return
+        bounds = self.bounds
+        lo = bisect_left(bounds, start)
+        hi = bisect_right(bounds, end, lo)
+        # An odd index means that boundary falls inside (or on the edge of) an existing interval
+        if lo % 2 == 0:
+            if hi % 2 == 0:
+                bounds[lo:hi] = (start, end)
+            else:
+                bounds[lo:hi] = (start,)
+        elif hi % 2 == 0:
+            bounds[lo:hi] = (end,)
+        else:
+            del bounds[lo:hi]
+
+    def overlap(self, start, end):
+        """Number of positions in [start, end) already covered."""
+        bounds = self.bounds
+        k = bisect_right(bounds, start)
+        covered = 0
+        if k % 2 == 1:
+            covered = min(end, bounds[k]) - start
+            k += 1
+        n = len(bounds)
+        while k < n and bounds[k] < end:
+            covered += min(end, bounds[k + 1]) - bounds[k]
+            k += 2
+        return covered
+
+    def covers(self, pos):
+        """True if position `pos` lies inside a covered interval."""
+        return bisect_right(self.bounds, pos) % 2 == 1
+
+    def __len__(self):
+        return len(self.bounds) // 2
+
+    def __iter__(self):
+        return zip(self.bounds[0::2], self.bounds[1::2])